@@ -0,0 +1,65 @@
+"""
+bench_lang_detect.py
+语言检测规则判定吞吐量：重写前的实现（lang_detect_reference.py）与当前 LanguageDetector._detect_rules 对比，
+单位为每秒消息数（不含 fastText 推理与检测缓存，日志关闭）
+
+用法（在仓库根目录）：
+    python bench/bench_lang_detect.py [--rounds 200]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bot.lang_detect import LanguageDetector
+from bench.lang_detect_reference import reference_detect_rules
+
+# 贴近实际群聊的消息组合
+CHAT_MIX = [
+    "Hello everyone, the meeting is moved to 3pm tomorrow.", "今天天气不错，我们出去玩吧", "ok", "lol thanks!!",
+    "Bonjour à tous, je suis là", "这个 PR 能 merge 吗", "https://example.com/foo", "check this out: https://example.com",
+    "Я не знаю", "12:30", "👍👍", "Guten Morgen, wie geht es dir?", "haha ok 好的", "Can you 帮我 look at this?",
+    "😀😀 nice",
+]
+
+# 在关键词阶段之前即由结构、投票或字数规则判定的消息
+EARLY = [
+    "Hello everyone, the meeting is moved to 3pm tomorrow.", "今天天气不错，我们出去玩吧", "ok", "lol thanks!!",
+    "Bonjour à tous, je suis là", "这个 PR 能 merge 吗", "check this out: https://example.com",
+    "Guten Morgen, wie geht es dir?", "haha ok 好的", "Can you 帮我 look at this?", "😀😀 nice",
+]
+
+class _Config:
+    def get(self, key, default=None):
+        return default
+
+def _rate(func, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            func(text)
+    return len(texts) * rounds / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="语言检测规则判定吞吐量")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    detector = LanguageDetector(_Config())
+    keywords = detector.lang_keywords
+
+    def reference(text):
+        return reference_detect_rules(text, keywords)
+
+    for name, texts in (("群聊消息组合", CHAT_MIX), ("关键词阶段之前判定", EARLY)):
+        old_rate = _rate(reference, texts, args.rounds)
+        new_rate = _rate(detector._detect_rules, texts, args.rounds)
+        print(f"{name}: 旧实现 {old_rate:,.0f} msg/s，新实现 {new_rate:,.0f} msg/s（{new_rate / old_rate:.1f}x）")
+
+if __name__ == "__main__":
+    main()
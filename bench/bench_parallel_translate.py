@@ -0,0 +1,90 @@
+"""
+bench_parallel_translate.py
+多源语言消息的翻译耗时：逐个源语言顺序翻译（原 handle_message 的循环）与
+TelegramBot._translate_groups 按源语言分组并发翻译对比。
+使用真实的 TranslationService（缓存、单飞、引擎并发调度），仅把引擎替换为固定延迟的桩引擎，不访问网络
+
+用法（在仓库根目录，需已安装 requirements.txt 中的依赖）：
+    python bench/bench_parallel_translate.py [--delay 0.2] [--rounds 5]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bot.translation import TranslationService
+from bot.telegram_client import TelegramBot
+
+# 规则 zh->en 与 en->zh|ja 下，一条中英混合消息检测出的源语言与目标语言
+SRC2TGTS = {"zh": {"en"}, "en": {"zh", "ja"}}
+
+class _Config:
+    def __init__(self, values=None):
+        self.values = values or {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+class _StubEngine:
+    """
+    固定延迟的桩引擎，只实现 TranslationService 调用的 translate 接口
+    """
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    async def translate(self, text, source_lang, target_lang):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"[{source_lang}->{target_lang}] {text}"
+
+async def sequential(service, text, src2tgts, prefer):
+    """
+    原流程：逐个源语言等待翻译完成后再发起下一个
+    """
+    translations = []
+    for src, tgts in sorted(src2tgts.items()):
+        translated = await service.translate(text, src, sorted(tgts), prefer=prefer)
+        for lang in sorted(tgts):
+            translations.append((src, lang, translated.get(lang, "")))
+    return translations
+
+async def run(args):
+    service = TranslationService(_Config({"default_translate_source": "deeplx"}))
+    engine = _StubEngine(args.delay)
+    service.engines = {"deeplx": engine, "openai": _StubEngine(args.delay)}
+    bot = TelegramBot.__new__(TelegramBot)
+    bot.translation_service = service
+    try:
+        for name, func in (("顺序翻译", sequential), ("分组并发", None)):
+            elapsed = []
+            for i in range(args.rounds):
+                # 每轮使用不同文本，避免命中翻译缓存
+                text = f"今天的会议改到下午三点 see you there #{name}{i}"
+                start = time.perf_counter()
+                if func is None:
+                    await bot._translate_groups(text, SRC2TGTS, "deeplx")
+                else:
+                    await func(service, text, SRC2TGTS, "deeplx")
+                elapsed.append(time.perf_counter() - start)
+            print(f"{name}: 平均 {sum(elapsed) / len(elapsed) * 1000:.0f} ms/条")
+        print(f"引擎调用次数: {engine.calls}")
+    finally:
+        await service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="多源语言消息的顺序与并发翻译耗时")
+    parser.add_argument("--delay", type=float, default=0.2, help="桩引擎单次翻译延迟（秒）")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
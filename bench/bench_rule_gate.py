@@ -0,0 +1,90 @@
+"""
+bench_rule_gate.py
+无规则发送者消息的单条处理成本：原流程（统一句号、strip、忽略词检查后才查规则）
+与 on_new_message 的快速路径（RuleManager.is_tracked + 指令白名单，两次哈希查找）对比
+
+用法（在仓库根目录）：
+    python bench/bench_rule_gate.py [--chats 2000] [--messages 200000]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bot.rules import RuleManager
+from bot.utils import build_ignore_matcher, should_ignore
+
+# config.yaml 不可读时使用的忽略词
+IGNORE_WORDS = ["cd", "60s", ".de", ".id", "id", "我的id", "已删除", "群id"]
+# 无规则发送者的典型消息
+MESSAGES = [
+    "Hello everyone, the meeting is moved to 3pm tomorrow.",
+    "今天天气不错，我们出去玩吧。",
+    "ok",
+    "check this out: https://example.com/some/long/path?with=query",
+    "这个 PR 能 merge 吗？\n顺便看一下 CI 的报错",
+]
+
+def load_ignore_words():
+    """
+    使用仓库 config.yaml 中的 ignore_words，使原流程的忽略词检查与实际部署一致
+    """
+    try:
+        import yaml
+        with open(os.path.join(ROOT, "config.yaml"), "r", encoding="utf-8") as f:
+            return (yaml.safe_load(f) or {}).get("ignore_words") or IGNORE_WORDS
+    except Exception:
+        return IGNORE_WORDS
+
+def legacy_path(rule_manager, matcher, chat_id, sender_id, text):
+    """
+    原 on_new_message/handle_message 在查规则之前的处理顺序
+    """
+    text_check = text.replace("。", ".") if text else text
+    if not text_check or text_check.strip().startswith(".fy-"):
+        return False
+    if should_ignore(text, matcher):
+        return False
+    return rule_manager.get_rule(str(chat_id), str(sender_id)) is not None
+
+def fast_path(rule_manager, my_tg_ids, chat_id, sender_id, text):
+    return rule_manager.is_tracked(chat_id, sender_id) or sender_id in my_tg_ids
+
+def main():
+    parser = argparse.ArgumentParser(description="无规则发送者的消息过滤成本")
+    parser.add_argument("--chats", type=int, default=2000, help="已配置规则的会话数")
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        rule_manager = RuleManager(os.path.join(tmp, "dynamic_rules.json"), {"debounce": 0})
+        with rule_manager.transaction() as txn:
+            for chat in range(args.chats):
+                txn.add_rule(-1000000 - chat, 1000 + chat, {"source_langs": ["en"], "target_langs": ["zh"]})
+        ignore_words = load_ignore_words()
+        matcher = build_ignore_matcher(ignore_words)
+        my_tg_ids = frozenset([42])
+        # 规则所在会话中的其他发送者 + 完全没有规则的会话
+        traffic = [
+            (-1000000 - (i % args.chats) if i % 2 else -2000000 - i, 5000 + i, MESSAGES[i % len(MESSAGES)])
+            for i in range(1000)
+        ]
+        print(f"已加载 {args.chats} 个会话的规则，忽略词 {len(ignore_words)} 个")
+        rounds = max(1, args.messages // len(traffic))
+        for name, func, extra in (("原流程", legacy_path, matcher), ("快速路径", fast_path, my_tg_ids)):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for chat_id, sender_id, text in traffic:
+                    func(rule_manager, extra, chat_id, sender_id, text)
+            per_msg = (time.perf_counter() - start) / (rounds * len(traffic)) * 1e6
+            print(f"{name}: {per_msg:.2f} us/条")
+        rule_manager.close()
+
+if __name__ == "__main__":
+    main()
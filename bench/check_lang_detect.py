@@ -0,0 +1,121 @@
+"""
+check_lang_detect.py
+语言检测规则判定的回归检查：LanguageDetector._detect_rules 必须与重写前的实现
+（lang_detect_reference.py）返回完全相同的 (判定, 计数)
+
+用法（在仓库根目录）：
+    python bench/check_lang_detect.py                   # 对照固定语料 lang_detect_corpus.jsonl
+    python bench/check_lang_detect.py --random 50000    # 另外随机生成文本，与旧实现逐条对照
+    python bench/check_lang_detect.py --regenerate      # 用旧实现重新生成固定语料（仅在语料需要扩充时使用）
+存在不一致时退出码为 1
+"""
+
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bot.lang_detect import LanguageDetector
+from bench.lang_detect_reference import reference_detect_rules
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lang_detect_corpus.jsonl")
+
+# 手写用例：常见聊天消息与各条规则的边界情况
+HANDWRITTEN = [
+    "", " ", "\n", "ok", "lol", "谢谢", "好", "Hello world", "hello", "Bonjour, comment ça va?", "Ich bin nicht da",
+    "123 456", "！！！", "ça où", "où est la gare", "le la", "Привет как дела", "早上好 good morning",
+    "good morning 早上好", "hi\n你好", "  \n 你好", "1. 你好\n2. hello", "你好，world", "你好 world",
+    "world 你好，", "This is a full English sentence.", "这个 PR 能 merge 吗", "Can you 帮我 look at this?",
+    "https://example.com/foo", "check this out: https://example.com", "12:30", "👍👍", "😀😀 nice",
+    "haha ok 好的", "a\x0b你好", "a\x1c你好", "a 你好", "x\r\n你好", "ça va très bien", "no sí pero",
+    "non sì ma", "não sim mas", "niet en is", "der die das", "und und und", "il est là", "est-ce que",
+    "it's fine", "don't", "O'Neil", "AI 与 ML", "GPU、CPU、内存", "？？", "...", "——", "İstanbul",
+    "ÀÉÎÕÜ", "naïve café", "中文。English.", "English。中文.", "1) a 2) b 3) 你", "你 我 他 a b c d",
+]
+
+ALPHABET = list("abcXYZ éèàüöß") + list("你好世界中文") + list("，,。！？!?.；;、 \n\t\r") + list("123@#:") \
+    + list("привет") + [" ", "\x0b", "\x1c", "İ"]
+WORDS = ["the", "is", "le", "la", "pas", "nicht", "und", "como", "quando", "voor", "也", "ihr", "niet", "hello",
+         "你好", "ça", "où", "très", "123", ":)", "😀", "—", "http://x.y/z", "This", "Good", "是", "吗"]
+JOINERS = [" ", ", ", "。", "\n", " ", "", ". ", "! "]
+
+class _Config:
+    def get(self, key, default=None):
+        return default
+
+def generate_texts(count, seed):
+    """
+    随机文本：一半为随机字符串（覆盖所有分隔符与换行符），一半为关键词拼接的短语
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            texts.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40))))
+        else:
+            lead = rng.choice(["", " ", "\n"])
+            texts.append(lead + "".join(rng.choice(WORDS) + rng.choice(JOINERS) for _ in range(rng.randint(1, 12))))
+    return texts
+
+def _normalize(result):
+    lang, counts = result
+    return lang, tuple(counts) if counts is not None else None
+
+def regenerate(detector):
+    texts = list(dict.fromkeys(HANDWRITTEN + generate_texts(3000, seed=18)))
+    with open(CORPUS_PATH, "w", encoding="utf-8") as f:
+        for text in texts:
+            expected = reference_detect_rules(text, detector.lang_keywords)
+            f.write(json.dumps({"text": text, "expected": expected}, ensure_ascii=False) + "\n")
+    print(f"已生成 {len(texts)} 条语料: {CORPUS_PATH}")
+
+def check_corpus(detector):
+    mismatches = []
+    total = 0
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            case = json.loads(line)
+            total += 1
+            expected = _normalize(case["expected"])
+            actual = _normalize(detector._detect_rules(case["text"]))
+            if actual != expected:
+                mismatches.append((case["text"], expected, actual))
+    return total, mismatches
+
+def check_random(detector, count, seed):
+    mismatches = []
+    for text in generate_texts(count, seed):
+        expected = _normalize(reference_detect_rules(text, detector.lang_keywords))
+        actual = _normalize(detector._detect_rules(text))
+        if actual != expected:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="语言检测规则判定回归检查")
+    parser.add_argument("--random", type=int, default=0, help="额外随机生成并对照的文本条数")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--regenerate", action="store_true", help="用旧实现重新生成固定语料")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    detector = LanguageDetector(_Config())
+    if args.regenerate:
+        regenerate(detector)
+        return 0
+    total, mismatches = check_corpus(detector)
+    print(f"固定语料: {total} 条，不一致 {len(mismatches)} 条")
+    if args.random:
+        random_mismatches = check_random(detector, args.random, args.seed)
+        print(f"随机文本: {args.random} 条 (seed={args.seed})，不一致 {len(random_mismatches)} 条")
+        mismatches += random_mismatches
+    for text, expected, actual in mismatches[:20]:
+        print(f"  {text!r}: 旧={expected} 新={actual}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
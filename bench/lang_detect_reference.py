@@ -0,0 +1,85 @@
+"""
+lang_detect_reference.py
+单次分词重写之前的规则判定（LanguageDetector._detect_rules 旧实现，仅去掉日志），
+作为 check_lang_detect.py 与 bench_lang_detect.py 的对照基准，不要随新实现一起修改
+"""
+
+import re
+
+def reference_detect_rules(text, lang_keywords):
+    """
+    已判定时返回 (语言, None)，否则返回 (None, (中文字数, 英文词数))
+    """
+    text_stripped = text.strip()
+    if not text_stripped:
+        return 'unknown', None
+    # 首行/首句为中文优先判定
+    lines = text_stripped.splitlines()
+    if lines:
+        first_line = lines[0].strip()
+        if re.search(r'[\u4e00-\u9fff]', first_line):
+            return 'zh', None
+    chinese_chars_count = len(re.findall(r'[\u4e00-\u9fff]', text))
+    english_words = re.findall(r'[a-zA-Z]+', text)
+    english_words_count = len(english_words)
+    starts_with_chinese = bool(re.match(r'[\u4e00-\u9fff]', text_stripped))
+    starts_with_english = bool(re.match(r'[a-zA-Z]', text_stripped))
+    full_width_punct_pattern = r'[，。！？；：]'
+    has_full_width_punct = bool(re.search(full_width_punct_pattern, text))
+    # 结构优先判定
+    if starts_with_chinese and has_full_width_punct:
+        return 'zh', None
+    if starts_with_english and english_words_count >= chinese_chars_count:
+        return 'en', None
+
+    # 分句主导语言投票
+    def phrase_main_lang(phrase):
+        zh_count = len(re.findall(r'[\u4e00-\u9fff]', phrase))
+        en_words_list = re.findall(r'[a-zA-Z]+', phrase)
+        en_word_count = len(en_words_list)
+        is_full_en_sentence = (
+            en_word_count >= 4 and
+            re.match(r'^[A-Z]', phrase.strip()) and
+            re.search(r'[.!?]$', phrase.strip())
+        )
+        if is_full_en_sentence:
+            return 'en'
+        if zh_count > en_word_count:
+            return 'zh'
+        elif en_word_count > zh_count:
+            return 'en'
+        else:
+            return None
+    split_phrases = re.split(r'[，,。！？!?.；;、\s]+', text)
+    phrase_langs = [phrase_main_lang(p) for p in split_phrases if p.strip()]
+    if len(phrase_langs) >= 2:
+        zh_votes = phrase_langs.count('zh')
+        en_votes = phrase_langs.count('en')
+        if zh_votes > en_votes:
+            return 'zh', None
+        if en_votes > zh_votes:
+            return 'en', None
+    # 短文本含中文优先判中文
+    if len(text_stripped) <= 6 and chinese_chars_count > 0:
+        return 'zh', None
+    # 字数比例
+    if chinese_chars_count > english_words_count:
+        return 'zh', None
+    if english_words_count > chinese_chars_count:
+        return 'en', None
+    # 高频词法
+    lang_hits = {}
+    text_lower = text.lower()
+    for lang, keywords in lang_keywords.items():
+        count = 0
+        for kw in keywords:
+            if re.search(rf"\b{re.escape(kw)}\b", text_lower):
+                count += 1
+        lang_hits[lang] = count
+    if lang_hits:
+        max_count = max(lang_hits.values())
+        if max_count > 0:
+            candidates = [lang for lang, cnt in lang_hits.items() if cnt == max_count]
+            if len(candidates) == 1:
+                return candidates[0], None
+    return None, (chinese_chars_count, english_words_count)
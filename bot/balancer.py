@@ -0,0 +1,75 @@
+"""
+balancer.py
+基于延迟与错误率的端点选择模块
+"""
+
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EndpointBalancer:
+    """
+    为每个候选（端点, 模型）维护延迟与错误率的 EWMA，
+    优先选择得分最低（最快且健康）的候选，并以一定概率随机探索其他候选
+    """
+    def __init__(self, alpha=0.3, explore_ratio=0.1, error_penalty=1.0, failure_cost=30.0):
+        self.alpha = float(alpha)
+        self.explore_ratio = float(explore_ratio)
+        self.error_penalty = float(error_penalty)
+        # 一次失败的代价（秒），默认取请求超时：失败后还要再试下一个候选
+        self.failure_cost = float(failure_cost)
+        # key -> [latency_ewma, error_ewma, samples]
+        self._stats = {}
+        self.explorations = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            alpha=cfg.get("alpha", 0.3),
+            explore_ratio=cfg.get("explore_ratio", 0.1),
+            error_penalty=cfg.get("error_penalty", 1.0),
+            failure_cost=cfg.get("failure_cost", 30.0),
+        )
+
+    def record(self, key, latency, ok):
+        """
+        记录一次请求结果；失败请求的耗时同样计入延迟
+        """
+        item = self._stats.get(key)
+        err = 0.0 if ok else 1.0
+        if item is None:
+            self._stats[key] = [latency, err, 1]
+            return
+        a = self.alpha
+        item[0] = a * latency + (1 - a) * item[0]
+        item[1] = a * err + (1 - a) * item[1]
+        item[2] += 1
+
+    def score(self, key):
+        """
+        得分越低越优先；尚无样本的候选得分为0，保证新端点会被尽快试用
+        错误率按 failure_cost 折算成附加延迟（加法），快速失败的候选不会因延迟低而排在健康候选之前
+        """
+        item = self._stats.get(key)
+        if item is None:
+            return 0.0
+        return item[0] + self.error_penalty * item[1] * self.failure_cost
+
+    def order(self, candidates, key=lambda c: c):
+        """
+        按得分排序候选（得分相同保持配置顺序），按探索概率将一个随机候选提到首位
+        """
+        ordered = sorted(candidates, key=lambda c: self.score(key(c)))
+        if len(ordered) > 1 and random.random() < self.explore_ratio:
+            pick = random.randrange(1, len(ordered))
+            ordered.insert(0, ordered.pop(pick))
+            self.explorations += 1
+        return ordered
+
+    def stats(self):
+        stats = {"explorations": self.explorations}
+        for key, (latency, err, samples) in sorted(self._stats.items(), key=lambda kv: self.score(kv[0])):
+            stats[key] = f"{latency * 1000:.0f}ms/err{err:.2f}/n{samples}"
+        return stats
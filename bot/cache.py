@@ -0,0 +1,249 @@
+"""
+cache.py
+翻译结果缓存模块
+"""
+
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def _estimate_size(key, value):
+    """
+    估算一条缓存占用的字节数（按 UTF-8 编码长度计算键中的文本与译文）
+    """
+    size = 0
+    for part in key:
+        if isinstance(part, str):
+            size += len(part.encode("utf-8"))
+    if isinstance(value, str):
+        size += len(value.encode("utf-8"))
+    return size
+
+class TranslationCache:
+    """
+    内存 LRU 缓存，get/set 均为 O(1)
+    同时按条目数与字节数限制容量，支持 TTL 过期，记录命中/未命中/淘汰统计
+    """
+    def __init__(self, max_entries=1000, max_bytes=8 * 1024 * 1024, ttl=0):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))  # 0 表示不限制字节数
+        self.ttl = float(ttl or 0)  # 0 表示永不过期
+        # key -> (value, size, expire_at)
+        self._data = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            max_entries=cfg.get("max_entries", 1000),
+            max_bytes=cfg.get("max_bytes", 8 * 1024 * 1024),
+            ttl=cfg.get("ttl", 0),
+        )
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, size, expire_at = item
+        if expire_at and expire_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        size = _estimate_size(key, value)
+        if self.max_bytes and size > self.max_bytes:
+            # 单条超过总容量，不缓存
+            return
+        if key in self._data:
+            self._remove(key)
+        expire_at = time.monotonic() + self.ttl if self.ttl > 0 else 0
+        self._data[key] = (value, size, expire_at)
+        self.total_bytes += size
+        while len(self._data) > self.max_entries or (self.max_bytes and self.total_bytes > self.max_bytes):
+            _, (_, old_size, _) = self._data.popitem(last=False)
+            self.total_bytes -= old_size
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.total_bytes -= size
+
+    def clear(self):
+        self._data.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class PersistentTranslationCache:
+    """
+    基于 SQLite 的持久化二级缓存，重启后仍可命中
+    键为 规范化原文+源语言+目标语言+引擎 的哈希；容量有上限，由后台任务定期压缩；
+    启动时可将命中次数最多的条目预热到内存缓存
+    所有方法均为同步阻塞调用，异步代码中应通过线程池调用
+    """
+    def __init__(self, path="translation_cache.db", max_entries=100000, ttl=0):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl or 0)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compacted = 0
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL, source_lang TEXT, target_lang TEXT, engine TEXT,"
+            " value TEXT NOT NULL, hits INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_access ON translations(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_hits ON translations(hits)")
+        self._conn.commit()
+        logger.info(f"[PersistentTranslationCache] 持久化缓存已打开: {self.path}")
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            path=cfg.get("path", "translation_cache.db"),
+            max_entries=cfg.get("max_entries", 100000),
+            ttl=cfg.get("ttl", 0),
+        )
+
+    @staticmethod
+    def make_key(key):
+        """
+        (text, source_lang, target_lang, engine) -> 哈希键，原文仅去除首尾空白
+        """
+        text, source_lang, target_lang, engine = key
+        raw = "\x1f".join((text.strip(), str(source_lang), str(target_lang), str(engine)))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        hkey = self.make_key(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM translations WHERE key = ?", (hkey,)
+            ).fetchone()
+            if row is None or (self.ttl > 0 and row[1] + self.ttl <= now):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE translations SET hits = hits + 1, last_access = ? WHERE key = ?", (now, hkey)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        text, source_lang, target_lang, engine = key
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO translations (key, text, source_lang, target_lang, engine, value, hits, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value, created = excluded.created,"
+                " last_access = excluded.last_access",
+                (self.make_key(key), text, source_lang, target_lang, engine, value, now, now),
+            )
+            self._conn.commit()
+            self.writes += 1
+
+    def warm(self, limit):
+        """
+        返回命中次数最多的若干条目 [(key_tuple, value)]，用于预热内存缓存
+        """
+        if limit <= 0:
+            return []
+        # 已过期的条目不预热
+        cutoff = time.time() - self.ttl if self.ttl > 0 else float("-inf")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, source_lang, target_lang, engine, value FROM translations"
+                " WHERE created > ? ORDER BY hits DESC, last_access DESC LIMIT ?", (cutoff, int(limit))
+            ).fetchall()
+        # 命中最多的最后写入，使其在内存 LRU 中最“新”
+        return [((r[0], r[1], r[2], r[3]), r[4]) for r in reversed(rows)]
+
+    def compact(self):
+        """
+        删除过期条目，并按最近访问时间淘汰超出容量的条目
+        """
+        now = time.time()
+        with self._lock:
+            removed = 0
+            if self.ttl > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM translations WHERE created <= ?", (now - self.ttl,)
+                ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM translations WHERE key IN ("
+                    " SELECT key FROM translations ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                ).rowcount
+            self._conn.commit()
+            if removed:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.compacted += removed
+        if removed:
+            logger.info(f"[PersistentTranslationCache] 压缩完成，移除 {removed} 条")
+        return removed
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                logger.warning(f"[PersistentTranslationCache] 关闭失败: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "compacted": self.compacted,
+        }
@@ -0,0 +1,77 @@
+"""
+circuit.py
+端点熔断器模块
+"""
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器：closed（正常）-> 连续失败达到阈值 -> open（熔断，跳过该端点）
+    -> 超过恢复时间 -> half_open（放行一个探测请求）-> 成功则 closed，失败则重新 open
+    后台探测成功也会直接恢复为 closed，无需重启
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, fail_threshold=3, recovery_timeout=60, probe_timeout=30):
+        self.name = name
+        self.fail_threshold = max(1, int(fail_threshold))
+        self.recovery_timeout = float(recovery_timeout)
+        self.probe_timeout = float(probe_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = 0.0
+        self.open_count = 0
+
+    def allow_request(self):
+        """
+        是否允许向该端点发送请求；half_open 状态同一时间只放行一个探测请求
+        """
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_started = now
+            logger.info(f"[CircuitBreaker] {self.name} 进入半开状态，放行探测请求")
+            return True
+        # half_open：上一个探测请求超时未回报时，允许再放行一个
+        if now - self._probe_started >= self.probe_timeout:
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"[CircuitBreaker] {self.name} 已恢复")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.fail_threshold):
+            self._open()
+        elif self.state == self.OPEN:
+            # 探测失败，重新计算恢复时间
+            self.opened_at = time.monotonic()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.open_count += 1
+        logger.error(f"[CircuitBreaker] {self.name} 连续失败{self.failures}次，已熔断，{self.recovery_timeout:.0f}秒后尝试恢复")
+
+    @property
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def describe(self):
+        return f"{self.state}/fail{self.failures}/opened{self.open_count}"
@@ -22,6 +22,7 @@ class CommandDispatcher:
             ".fy-off": self._handle_off,
             ".fy-add": self._handle_add,
             ".fy-del": self._handle_del,
+            ".fy-stats": self._handle_stats,
         }
 
     async def dispatch(self, event):
@@ -46,14 +47,13 @@ class CommandDispatcher:
         config_manager = getattr(self.bot, "config_manager", None)
         my_tg_ids = set()
         if config_manager:
-            tg_cfg = config_manager.get("telegram", {})
-            ids = tg_cfg.get("my_tg_ids", [])
-            # 兼容单用户写法
-            if not ids:
-                single_id = tg_cfg.get("my_tg_id")
-                if single_id is not None:
-                    ids = [single_id]
-            my_tg_ids = {int(i) for i in ids if i is not None}
+            # 优先使用 bot 按配置版本缓存的白名单，无效ID只在重建时警告一次
+            get_my_tg_ids = getattr(self.bot, "_get_my_tg_ids", None)
+            if get_my_tg_ids is not None:
+                my_tg_ids = get_my_tg_ids()
+            else:
+                from .utils import parse_my_tg_ids
+                my_tg_ids = parse_my_tg_ids(config_manager.get("telegram", {}))
         sender_id = getattr(event, "sender_id", None)
         # 兼容event.message.sender_id
         if hasattr(event, "message") and hasattr(event.message, "sender_id") and event.message.sender_id is not None:
@@ -174,6 +174,18 @@ class CommandDispatcher:
         logger.info("[CommandDispatcher] 已清空所有翻译规则")
         await send_ephemeral_reply(event, "已清空所有翻译规则。")
 
+    async def _handle_stats(self, event, args):
+        stats = self.bot.get_stats()
+        logger.info(f"[CommandDispatcher] 运行统计: {stats}")
+        lines = ["运行统计:"]
+        for section, values in stats.items():
+            if isinstance(values, dict):
+                lines.append(f"[{section}] " + "  ".join(f"{k}={v}" for k, v in values.items()))
+            else:
+                lines.append(f"[{section}] {values}")
+        from .utils import send_ephemeral_reply
+        await send_ephemeral_reply(event, "\n".join(lines))
+
     async def _handle_help(self, event, args):
         msg = (
             "指令帮助：\n"
@@ -193,6 +205,7 @@ class CommandDispatcher:
             "- `.fy-del,成员id或用户名,ar|fr,*` 群聊-任意模板语言时可以省略通配符*；\n"
             "- `.fy-clear` 一键清空所有翻译规则；\n"
             "- `.fy-list` 查看用户开启翻译功能的规则；\n"
+            "- `.fy-stats` 查看缓存、出站队列等运行统计；\n"
             "- `.fy-help` 查看指令与用法说明。"
         )
         from .utils import send_ephemeral_reply
@@ -240,12 +253,13 @@ class CommandDispatcher:
         except Exception:
             username = str(event.sender_id)
         saved_rules = []
-        for src in src_list:
-            for tgt in tgt_list:
-                if src == tgt:
-                    continue
-                self.bot.rule_manager.set_rule(chat_id, user_id, {"source_langs": [src], "target_langs": [tgt]}, username=username)
-                saved_rules.append(f"{src}→{tgt}")
+        with self.bot.rule_manager.transaction() as txn:
+            for src in src_list:
+                for tgt in tgt_list:
+                    if src == tgt:
+                        continue
+                    txn.add_rule(chat_id, user_id, {"source_langs": [src], "target_langs": [tgt]}, username=username)
+                    saved_rules.append(f"{src}→{tgt}")
         if saved_rules:
             rule_desc = argstr if argstr else "中英互译"
             await send_ephemeral_reply(
@@ -291,17 +305,11 @@ class CommandDispatcher:
             if src_match and tgt_match:
                 continue  # 删除
             new_rules.append(rule)
+        # 整体替换剩余规则（保留 username 字段），无剩余规则时等同于移除
+        self.bot.rule_manager.replace_rules(chat_id, user_id, new_rules)
         if not new_rules:
-            self.bot.rule_manager.remove_rule(chat_id, user_id)
             await send_ephemeral_reply(event, f"已移除指定源/目标语言的翻译规则。")
-        elif len(new_rules) == 1:
-            self.bot.rule_manager.set_rule(chat_id, user_id, new_rules[0])
-            await send_ephemeral_reply(event, f"已移除部分规则，其余规则仍保留。")
         else:
-            # 多条规则时直接赋值并保存，保留 username 字段
-            with self.bot.rule_manager._lock:
-                self.bot.rule_manager._rules.setdefault(str(chat_id), {})[str(user_id)] = new_rules
-                self.bot.rule_manager._save_rules()
             await send_ephemeral_reply(event, f"已移除部分规则，其余规则仍保留。")
 
     async def _handle_add(self, event, args):
@@ -364,11 +372,12 @@ class CommandDispatcher:
                     await send_ephemeral_reply(event, "语言代码不合法，请检查输入。")
                     return
                 saved_rules = []
-                for s in src:
-                    filtered_tgts = [t for t in tgt if t != s]
-                    if filtered_tgts:
-                        self.bot.rule_manager.set_rule(chat_id, mem_id, {"source_langs": [s], "target_langs": filtered_tgts}, username=username)
-                        saved_rules.append(f"{s}→{'|'.join(filtered_tgts)}")
+                with self.bot.rule_manager.transaction() as txn:
+                    for s in src:
+                        filtered_tgts = [t for t in tgt if t != s]
+                        if filtered_tgts:
+                            txn.add_rule(chat_id, mem_id, {"source_langs": [s], "target_langs": filtered_tgts}, username=username)
+                            saved_rules.append(f"{s}→{'|'.join(filtered_tgts)}")
                 if saved_rules:
                     rule_desc = f"{'|'.join(src)}→{'|'.join(tgt)}"
                     await send_ephemeral_reply(
@@ -407,11 +416,12 @@ class CommandDispatcher:
                 peer_username = self._get_display_name(entity)
             except Exception:
                 peer_username = str(chat_id)
-            for s in src:
-                filtered_tgts = [t for t in tgt if t != s]
-                if filtered_tgts:
-                    self.bot.rule_manager.set_rule(chat_id, chat_id, {"source_langs": [s], "target_langs": filtered_tgts}, username=peer_username)
-                    saved_rules.append(f"{s}→{'|'.join(filtered_tgts)}")
+            with self.bot.rule_manager.transaction() as txn:
+                for s in src:
+                    filtered_tgts = [t for t in tgt if t != s]
+                    if filtered_tgts:
+                        txn.add_rule(chat_id, chat_id, {"source_langs": [s], "target_langs": filtered_tgts}, username=peer_username)
+                        saved_rules.append(f"{s}→{'|'.join(filtered_tgts)}")
             if saved_rules:
                 rule_desc = f"{'|'.join(src)}→{'|'.join(tgt)}"
                 await send_ephemeral_reply(
@@ -444,8 +454,8 @@ class CommandDispatcher:
             if not args:
                 # 无参数，删除全群成员规则
                 if group_rules:
-                    for uid in list(group_rules.keys()):
-                        self.bot.rule_manager.remove_rule(chat_id, uid)
+                    with self.bot.rule_manager.transaction() as txn:
+                        txn.remove_chat(chat_id)
                     await send_ephemeral_reply(event, "已移除当前群所有成员翻译规则")
                 else:
                     await send_ephemeral_reply(event, "本群无可删除成员规则")
@@ -456,7 +466,7 @@ class CommandDispatcher:
             src_is_any = len(src) == 1 and src[0] == "*"
             tgt_is_any = len(tgt) == 1 and tgt[0] == "*"
             found = False
-            to_remove = []
+            replacements = {}
             mem_ids = set()
             mem_usernames = set()
             if mem_arg == "*":
@@ -518,19 +528,13 @@ class CommandDispatcher:
                         if src_match and tgt_match:
                             continue  # 删除
                         new_rules.append(rule)
-                # 原脚本风格：如无剩余规则则 remove_rule，否则整体 set_rule
-                if not new_rules:
-                    self.bot.rule_manager.remove_rule(chat_id, uid)
-                else:
-                    # 兼容多条规则整体覆盖
-                    if len(new_rules) == 1:
-                        self.bot.rule_manager.set_rule(chat_id, uid, new_rules[0], username=new_rules[0].get("username"))
-                    else:
-                        # 直接赋值并保存，保留 username 字段
-                        with self.bot.rule_manager._lock:
-                            self.bot.rule_manager._rules.setdefault(str(chat_id), {})[str(uid)] = new_rules
-                            self.bot.rule_manager._save_rules()
+                # 整体替换剩余规则（保留 username 字段），无剩余规则时等同于移除
+                replacements[uid] = new_rules
                 found = True
+            if replacements:
+                with self.bot.rule_manager.transaction() as txn:
+                    for uid, new_rules in replacements.items():
+                        txn.replace(chat_id, uid, new_rules)
             if found:
                 await send_ephemeral_reply(event, f"已移除成员{mem_arg}在本群的指定源/目标语言翻译规则。")
             else:
@@ -576,16 +580,10 @@ class CommandDispatcher:
                         tgt_match = tgt_is_any or not tgt or any(t in rule_tgt for t in tgt)
                         if not (src_match and tgt_match):
                             new_rules.append(rule)
-                # 兼容多条规则整体覆盖
+                # 整体替换剩余规则（保留 username 字段），无剩余规则时等同于移除
+                self.bot.rule_manager.replace_rules(chat_id, chat_id, new_rules)
                 if not new_rules:
-                    self.bot.rule_manager.remove_rule(chat_id, chat_id)
                     await send_ephemeral_reply(event, f"已移除指定源/目标语言的翻译规则。")
-                elif len(new_rules) == 1:
-                    self.bot.rule_manager.set_rule(chat_id, chat_id, new_rules[0], username=new_rules[0].get("username"))
-                    await send_ephemeral_reply(event, f"已移除部分规则，其余规则仍保留。")
                 else:
-                    with self.bot.rule_manager._lock:
-                        self.bot.rule_manager._rules.setdefault(str(chat_id), {})[str(chat_id)] = new_rules
-                        self.bot.rule_manager._save_rules()
                     await send_ephemeral_reply(event, f"已移除部分规则，其余规则仍保留。")
             return
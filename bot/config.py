@@ -16,6 +16,8 @@ class ConfigManager:
     def __init__(self, path='config.yaml'):
         self.path = path
         self._lock = threading.Lock()
+        # 配置版本号，每次热重载递增，供各模块判断派生缓存是否需要重建
+        self.version = 0
         logger.info(f"[ConfigManager] 初始化，加载配置文件: {self.path}")
         self._config = self._load_config()
 
@@ -36,6 +38,7 @@ class ConfigManager:
         with self._lock:
             logger.info("[ConfigManager] 重新加载配置文件")
             self._config = self._load_config()
+            self.version += 1
 
     def get(self, key, default=None):
         """
@@ -0,0 +1,86 @@
+"""
+hedging.py
+对冲请求策略模块：按历史延迟分位数决定何时发出对冲请求，并限制对冲带来的额外负载
+"""
+
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class HedgePolicy:
+    """
+    每个引擎保留最近 window 次成功请求的耗时，对冲延迟取其 percentile 分位数（限定在 [min_delay, max_delay]）；
+    预算采用令牌桶：每个主请求积累 budget_ratio 个令牌（上限 burst），每次对冲消耗 1 个
+    """
+    def __init__(self, enabled=False, percentile=0.9, min_delay=0.5, max_delay=5.0,
+                 budget_ratio=0.1, burst=5, window=200, min_samples=20):
+        self.enabled = bool(enabled)
+        self.percentile = min(max(float(percentile), 0.0), 1.0)
+        self.min_delay = float(min_delay)
+        self.max_delay = float(max_delay)
+        self.budget_ratio = float(budget_ratio)
+        self.burst = float(burst)
+        self.window = int(window)
+        self.min_samples = int(min_samples)
+        self._samples = {}
+        self._tokens = self.burst
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            enabled=cfg.get("enabled", False),
+            percentile=cfg.get("percentile", 0.9),
+            min_delay=cfg.get("min_delay", 0.5),
+            max_delay=cfg.get("max_delay", 5.0),
+            budget_ratio=cfg.get("budget_ratio", 0.1),
+            burst=cfg.get("burst", 5),
+            window=cfg.get("window", 200),
+            min_samples=cfg.get("min_samples", 20),
+        )
+
+    def record_latency(self, engine, latency):
+        samples = self._samples.get(engine)
+        if samples is None:
+            samples = self._samples[engine] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def delay(self, engine):
+        """
+        对冲前等待的秒数；样本不足时使用 max_delay
+        """
+        samples = self._samples.get(engine)
+        if not samples or len(samples) < self.min_samples:
+            return self.max_delay
+        ordered = sorted(samples)
+        idx = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return min(max(ordered[idx], self.min_delay), self.max_delay)
+
+    def on_request(self):
+        self.requests += 1
+        self._tokens = min(self.burst, self._tokens + self.budget_ratio)
+
+    def try_acquire(self):
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.hedged += 1
+            return True
+        self.budget_denied += 1
+        return False
+
+    def stats(self):
+        stats = {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+        }
+        for engine in self._samples:
+            stats[f"delay_{engine}_ms"] = round(self.delay(engine) * 1000)
+        return stats
@@ -0,0 +1,113 @@
+"""
+http_client.py
+共享 HTTP 客户端（aiohttp）管理模块
+"""
+
+import logging
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class HttpClientManager:
+    """
+    管理全局共享的 aiohttp.ClientSession：
+    可配置的 TCPConnector（总连接数、单主机连接数、keep-alive、DNS 缓存）、会话级超时，
+    通过 TraceConfig 统计新建连接与复用连接次数，随机器人生命周期关闭
+    """
+    def __init__(self, limit=100, limit_per_host=10, keepalive_timeout=60, ttl_dns_cache=300,
+                 use_dns_cache=True, total_timeout=60, connect_timeout=10):
+        self.limit = int(limit)
+        self.limit_per_host = int(limit_per_host)
+        self.keepalive_timeout = float(keepalive_timeout)
+        self.ttl_dns_cache = int(ttl_dns_cache) if ttl_dns_cache is not None else None
+        self.use_dns_cache = bool(use_dns_cache)
+        self.total_timeout = float(total_timeout)
+        self.connect_timeout = float(connect_timeout)
+        self._session = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.connections_queued = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            limit=cfg.get("limit", 100),
+            limit_per_host=cfg.get("limit_per_host", 10),
+            keepalive_timeout=cfg.get("keepalive_timeout", 60),
+            ttl_dns_cache=cfg.get("ttl_dns_cache", 300),
+            use_dns_cache=cfg.get("use_dns_cache", True),
+            total_timeout=cfg.get("total_timeout", 60),
+            connect_timeout=cfg.get("connect_timeout", 10),
+        )
+
+    def _build_trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.requests += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        async def on_connection_queued_start(session, ctx, params):
+            self.connections_queued += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.dns_cache_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_connection_queued_start.append(on_connection_queued_start)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+                use_dns_cache=self.use_dns_cache,
+            )
+            timeout = aiohttp.ClientTimeout(total=self.total_timeout, sock_connect=self.connect_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                trace_configs=[self._build_trace_config()],
+            )
+            logger.info(
+                f"[HttpClientManager] 创建共享会话: limit={self.limit}, limit_per_host={self.limit_per_host}, "
+                f"keepalive={self.keepalive_timeout}s, dns_ttl={self.ttl_dns_cache}s"
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("[HttpClientManager] 共享会话已关闭")
+        self._session = None
+
+    def stats(self):
+        connections = self.connections_created + self.connections_reused
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_rate": round(self.connections_reused / connections, 4) if connections else 0.0,
+            "queued_for_connection": self.connections_queued,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
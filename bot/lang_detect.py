@@ -4,10 +4,23 @@ lang_detect.py
 """
 
 import re
+import asyncio
 import logging
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+_ASCII_LETTER_RE = re.compile(r'[a-zA-Z]')
+# 与 str.splitlines() 相同的换行符集合
+_LINE_BREAK_RE = re.compile(r'[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+# 单次分词：分句分隔符 / 连续汉字 / 英文单词 / 其他字符
+_TOKEN_RE = re.compile(
+    r'(?P<sep>[，,。！？!?.；;、\s]+)|(?P<zh>[\u4e00-\u9fff]+)|(?P<en>[a-zA-Z]+)'
+    r'|[^，,。！？!?.；;、\s\u4e00-\u9fffa-zA-Z]+'
+)
+_WORD_RE = re.compile(r'\w+')
+
 class LanguageDetector:
     """
     多策略分层语言检测，支持结构规则、fasttext、关键词、字符区间等
@@ -15,8 +28,24 @@ class LanguageDetector:
     def __init__(self, config_manager):
         self.config_manager = config_manager
         self.fasttext_model = None
-        logger.info("[LanguageDetector] 初始化，加载 fasttext 模型")
-        self._init_fasttext()
+        # fastText 推理线程池与批处理队列：[(输入文本, future)]
+        self._executor = None
+        self._pending = []
+        self._drainers = 0
+        self.batches = 0
+        self.batched_texts = 0
+        # 检测结果缓存（LRU）：规范化文本 -> 语言
+        self._memo = OrderedDict()
+        self._memo_version = None
+        self._memo_fingerprint = None
+        self._memo_max_entries = 0
+        self._memo_max_chars = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        # fasttext 模型由 load_model_async 在后台加载，加载完成前仅使用规则判定
+        self._load_task = None
+        self.model_load_seconds = None
+        logger.info("[LanguageDetector] 初始化完成，fasttext 模型将在后台加载")
         self.lang_keywords = {
             "fr": ["pas", "est", "le", "la", "un", "une", "je", "tu", "vous", "nous", "avec", "pour", "mais", "sur", "dans", "des", "du", "au", "aux", "ce", "cette", "ces", "mon", "ton", "son", "leur", "qui", "que", "quoi", "où", "comment", "parce", "bien", "mal", "très", "plus", "moins", "aussi", "comme", "si", "non", "oui"],
             "en": ["the", "is", "are", "you", "he", "she", "it", "and", "but", "not", "with", "for", "on", "in", "at", "by", "to", "of", "from", "as", "that", "this", "these", "those", "my", "your", "his", "her", "their", "who", "what", "where", "how", "because", "very", "well", "bad", "good", "no", "yes"],
@@ -26,139 +55,338 @@ class LanguageDetector:
             "pt": ["não", "sim", "mas", "muito", "também", "como", "mais", "menos", "por", "para", "com", "sem", "sobre", "entre", "quando", "porque", "que", "quem", "onde", "como", "quando", "eu", "tu", "ele", "ela", "nós", "vós", "eles", "elas", "meu", "teu", "seu", "nosso", "vosso", "este", "esse", "aquele", "um", "uma", "uns", "umas"],
             "nl": ["niet", "en", "is", "ik", "jij", "hij", "zij", "wij", "jullie", "mijn", "jouw", "zijn", "haar", "ons", "onze", "geen", "ja", "nee", "alstublieft", "dank", "goed", "slecht", "zeer", "也", "maar", "of", "als", "omdat", "wat", "wie", "hoe", "waar", "waarom", "dat", "deze", "dit", "een", "met", "voor", "op", "in", "uit", "bij", "naar", "voor", "over", "onder", "tussen"]
         }
+        # 关键词 -> 所属语言列表（同一列表中重复出现的词保留重复）
+        self._keyword_index = {}
+        for lang, keywords in self.lang_keywords.items():
+            for kw in keywords:
+                self._keyword_index.setdefault(kw, []).append(lang)
 
     def _init_fasttext(self):
+        """
+        阻塞加载 fasttext 模型（在线程池中执行）：模型文件不存在时先下载到临时文件再原子替换，
+        支持 lid.176.bin 与压缩版 lid.176.ftz（按 model_path 扩展名选择下载地址）；返回 (模型, 下载耗时, 加载耗时)
+        """
+        import os
+        import time
+        import fasttext
+        ft_cfg = self.config_manager.get("fasttext", {}) or {}
+        model_path = ft_cfg.get("model_path", "lid.176.bin")
+        download_seconds = 0.0
+        if not os.path.exists(model_path):
+            logger.warning(f"[LanguageDetector] fasttext 模型文件不存在: {model_path}，尝试自动下载...")
+            name = "lid.176.ftz" if model_path.endswith(".ftz") else "lid.176.bin"
+            url = ft_cfg.get("model_url") or f"https://dl.fbaipublicfiles.com/fasttext/supervised-models/{name}"
+            start = time.monotonic()
+            tmp_path = f"{model_path}.part"
+            try:
+                import requests
+                with requests.get(url, stream=True, timeout=60) as r:
+                    r.raise_for_status()
+                    with open(tmp_path, "wb") as f:
+                        for chunk in r.iter_content(chunk_size=1 << 16):
+                            if chunk:
+                                f.write(chunk)
+                os.replace(tmp_path, model_path)
+                download_seconds = time.monotonic() - start
+                logger.info(f"[LanguageDetector] fasttext 模型已自动下载到: {model_path}，耗时 {download_seconds:.1f}s")
+            except Exception as e:
+                logger.error(f"[LanguageDetector] fasttext 模型自动下载失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        if not os.path.exists(model_path):
+            raise Exception(f"fasttext 模型文件仍不存在: {model_path}")
+        start = time.monotonic()
+        model = fasttext.load_model(model_path)
+        return model, download_seconds, time.monotonic() - start
+
+    async def load_model_async(self):
+        """
+        后台加载 fasttext 模型，不阻塞事件循环与 Telegram 客户端启动；
+        加载完成后清空检测缓存（此前的结果未经过 fasttext 判定）
+        """
+        ft_cfg = self.config_manager.get("fasttext", {}) or {}
+        if not ft_cfg.get("enabled", True) or self.fasttext_model is not None:
+            return
+        import time
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
         try:
-            import fasttext
-            model_path = self.config_manager.get("fasttext", {}).get("model_path", "lid.176.bin")
-            import os
-            if not os.path.exists(model_path):
-                logger.warning(f"[LanguageDetector] fasttext 模型文件不存在: {model_path}，尝试自动下载...")
-                try:
-                    import requests
-                    url = "https://dl.fbaipublicfiles.com/fasttext/supervised-models/lid.176.bin"
-                    with requests.get(url, stream=True, timeout=60) as r:
-                        r.raise_for_status()
-                        with open(model_path, "wb") as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                    logger.info(f"[LanguageDetector] fasttext 模型已自动下载到: {model_path}")
-                except Exception as e:
-                    logger.error(f"[LanguageDetector] fasttext 模型自动下载失败: {e}")
-            if os.path.exists(model_path):
-                self.fasttext_model = fasttext.load_model(model_path)
-                logger.info(f"[LanguageDetector] fasttext 模型加载成功: {model_path}")
-            else:
-                logger.warning(f"[LanguageDetector] fasttext 模型文件仍不存在: {model_path}")
+            model, download_seconds, load_seconds = await loop.run_in_executor(None, self._init_fasttext)
         except Exception as e:
             self.fasttext_model = None
-            logger.error(f"[LanguageDetector] fasttext 模型加载失败: {e}")
+            logger.error(f"[LanguageDetector] fasttext 模型加载失败，仅使用规则判定: {e}")
+            return
+        self.fasttext_model = model
+        self.model_load_seconds = time.monotonic() - start
+        self.clear_memo()
+        logger.info(
+            f"[LanguageDetector] fasttext 模型加载成功: {ft_cfg.get('model_path', 'lid.176.bin')}，"
+            f"下载 {download_seconds:.1f}s，加载 {load_seconds:.1f}s，共 {self.model_load_seconds:.1f}s"
+        )
+
+    def start_background_load(self):
+        """
+        在当前事件循环中创建后台加载任务（重复调用只加载一次）
+        """
+        if self._load_task is None:
+            self._load_task = asyncio.get_event_loop().create_task(self.load_model_async())
+        return self._load_task
 
     def detect(self, text):
         """
-        检测文本主语言，返回语言代码或列表
+        检测文本主语言，返回语言代码或列表（同步版本，fastText 推理在调用线程内执行）
+        """
+        key, cached = self._memo_get(text)
+        if cached is not None:
+            return cached
+        result = self._detect_uncached(text)
+        self._memo_put(key, result)
+        return result
+
+    async def detect_async(self, text):
+        """
+        异步检测：规则判定在事件循环内完成（纯正则），需要 fastText 时提交到线程池，
+        同时排队的多条文本合并为一次 predict(list) 调用，事件循环不会被推理阻塞
+        """
+        key, cached = self._memo_get(text)
+        if cached is not None:
+            return cached
+        result = await self._detect_async_uncached(text)
+        self._memo_put(key, result)
+        return result
+
+    def _detect_uncached(self, text):
+        result, counts = self._detect_rules(text)
+        if counts is None:
+            return result
+        pred = None
+        if self._fasttext_enabled():
+            try:
+                labels, probs = self.fasttext_model.predict(self._fasttext_input(text))
+                pred = self._parse_prediction(labels, probs)
+            except Exception as e:
+                logger.error(f"[LanguageDetector] fasttext 检测异常: {e}")
+        return self._resolve(text, counts, pred)
+
+    async def _detect_async_uncached(self, text):
+        result, counts = self._detect_rules(text)
+        if counts is None:
+            return result
+        pred = None
+        if self._fasttext_enabled():
+            try:
+                pred = await self._predict_batched(self._fasttext_input(text))
+            except Exception as e:
+                logger.error(f"[LanguageDetector] fasttext 检测异常: {e}")
+        return self._resolve(text, counts, pred)
+
+    def _memo_config(self):
+        """
+        检测缓存配置；配置热重载后 fasttext 段有变化时清空缓存（阈值、开关会改变检测结果）
+        """
+        version = self.config_manager.version
+        if version != self._memo_version:
+            self._memo_version = version
+            memo_cfg = self.config_manager.get("lang_detect_cache", {}) or {}
+            self._memo_max_entries = int(memo_cfg.get("max_entries", 5000)) if memo_cfg.get("enabled", True) else 0
+            self._memo_max_chars = int(memo_cfg.get("max_text_chars", 512))
+            fingerprint = repr(sorted((self.config_manager.get("fasttext", {}) or {}).items()))
+            if fingerprint != self._memo_fingerprint:
+                if self._memo:
+                    logger.info(f"[LanguageDetector] fasttext 配置已变化，清空检测缓存 {len(self._memo)} 条")
+                self._memo.clear()
+                self._memo_fingerprint = fingerprint
+        return self._memo_max_entries, self._memo_max_chars
+
+    def _memo_get(self, text):
+        """
+        返回 (缓存键, 缓存结果)；键为去除首尾空白后的原文，超过 max_text_chars 的长文本不缓存（键为 None）
+        不合并空白、不折叠大小写：短文本规则依赖去除首尾空白后的长度，字数统计与 fastText 均区分字符，
+        任何更宽松的归一化都会让判定结果不同的文本共用同一个键
+        """
+        max_entries, max_chars = self._memo_config()
+        if max_entries <= 0 or not text or len(text) > max_chars:
+            return None, None
+        key = text.strip()
+        result = self._memo.get(key)
+        if result is None:
+            self.memo_misses += 1
+            return key, None
+        self._memo.move_to_end(key)
+        self.memo_hits += 1
+        return key, list(result) if isinstance(result, list) else result
+
+    def _memo_put(self, key, result):
+        if key is None:
+            return
+        self._memo[key] = list(result) if isinstance(result, list) else result
+        while len(self._memo) > self._memo_max_entries:
+            self._memo.popitem(last=False)
+
+    def clear_memo(self):
+        self._memo.clear()
+
+    def _detect_rules(self, text):
+        """
+        fastText 之前的规则判定：已判定时返回 (语言, None)，否则返回 (None, (中文字数, 英文词数))
+        单次分词遍历同时得到中文字数、英文词数与分句投票；高频词法仅在前面规则均未判定时才分词查表
         """
         logger.info(f"[LanguageDetector] 检测文本语言: {text[:20]}...")
         text_stripped = text.strip()
         if not text_stripped:
             logger.warning("[LanguageDetector] 空文本，返回 unknown")
-            return 'unknown'
-        # 新增：首行/首句为中文优先判定
-        lines = text_stripped.splitlines()
-        if lines:
-            first_line = lines[0].strip()
-            if re.search(r'[\u4e00-\u9fff]', first_line):
-                logger.info("[LanguageDetector] 首行含中文，整体判定为中文")
-                return 'zh'
-        chinese_chars_count = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_words = re.findall(r'[a-zA-Z]+', text)
-        english_words_count = len(english_words)
-        starts_with_chinese = bool(re.match(r'[\u4e00-\u9fff]', text_stripped))
-        starts_with_english = bool(re.match(r'[a-zA-Z]', text_stripped))
-        full_width_punct_pattern = r'[，。！？；：]'
-        has_full_width_punct = bool(re.search(full_width_punct_pattern, text))
-        # 结构优先判定
-        if starts_with_chinese and has_full_width_punct:
-            logger.info("[LanguageDetector] 结构判定为中文")
-            return 'zh'
-        if starts_with_english and english_words_count >= chinese_chars_count:
+            return 'unknown', None
+        # 首行含中文优先判定：第一个汉字之前没有换行
+        m = _CJK_RE.search(text_stripped)
+        if m and not _LINE_BREAK_RE.search(text_stripped, 0, m.start()):
+            logger.info("[LanguageDetector] 首行含中文，整体判定为中文")
+            return 'zh', None
+        chinese_chars_count = 0
+        english_words_count = 0
+        phrases = zh_votes = en_votes = 0
+        phrase_zh = phrase_en = 0
+        in_phrase = False
+        for m in _TOKEN_RE.finditer(text):
+            kind = m.lastgroup
+            if kind == "sep":
+                if in_phrase:
+                    phrases += 1
+                    if phrase_zh > phrase_en:
+                        zh_votes += 1
+                    elif phrase_en > phrase_zh:
+                        en_votes += 1
+                    chinese_chars_count += phrase_zh
+                    english_words_count += phrase_en
+                    phrase_zh = phrase_en = 0
+                    in_phrase = False
+                continue
+            in_phrase = True
+            if kind == "zh":
+                phrase_zh += m.end() - m.start()
+            elif kind == "en":
+                phrase_en += 1
+        if in_phrase:
+            phrases += 1
+            if phrase_zh > phrase_en:
+                zh_votes += 1
+            elif phrase_en > phrase_zh:
+                en_votes += 1
+            chinese_chars_count += phrase_zh
+            english_words_count += phrase_en
+        # 结构优先判定（首行含中文的情况已在上面返回）
+        if _ASCII_LETTER_RE.match(text_stripped) and english_words_count >= chinese_chars_count:
             logger.info("[LanguageDetector] 结构判定为英文")
-            return 'en'
+            return 'en', None
         # 分句主导语言投票
-        def phrase_main_lang(phrase):
-            zh_count = len(re.findall(r'[\u4e00-\u9fff]', phrase))
-            en_words_list = re.findall(r'[a-zA-Z]+', phrase)
-            en_word_count = len(en_words_list)
-            is_full_en_sentence = (
-                en_word_count >= 4 and
-                re.match(r'^[A-Z]', phrase.strip()) and
-                re.search(r'[.!?]$', phrase.strip())
-            )
-            if is_full_en_sentence:
-                return 'en'
-            if zh_count > en_word_count:
-                return 'zh'
-            elif en_word_count > zh_count:
-                return 'en'
-            else:
-                return None
-        split_phrases = re.split(r'[，,。！？!?.；;、\s]+', text)
-        phrase_langs = [phrase_main_lang(p) for p in split_phrases if p.strip()]
-        if len(phrase_langs) >= 2:
-            zh_votes = phrase_langs.count('zh')
-            en_votes = phrase_langs.count('en')
+        if phrases >= 2:
             if zh_votes > en_votes:
                 logger.info("[LanguageDetector] 分句投票判定为中文")
-                return 'zh'
+                return 'zh', None
             if en_votes > zh_votes:
                 logger.info("[LanguageDetector] 分句投票判定为英文")
-                return 'en'
+                return 'en', None
         # 短文本含中文优先判中文
         if len(text_stripped) <= 6 and chinese_chars_count > 0:
             logger.info("[LanguageDetector] 短文本含中文，判定为中文")
-            return 'zh'
+            return 'zh', None
         # 字数比例
         if chinese_chars_count > english_words_count:
             logger.info("[LanguageDetector] 字数比例判定为中文")
-            return 'zh'
+            return 'zh', None
         if english_words_count > chinese_chars_count:
             logger.info("[LanguageDetector] 字数比例判定为英文")
-            return 'en'
-        # 高频词法
-        lang_hits = {}
-        text_lower = text.lower()
-        for lang, keywords in self.lang_keywords.items():
-            count = 0
-            for kw in keywords:
-                if re.search(rf"\b{re.escape(kw)}\b", text_lower):
-                    count += 1
-            lang_hits[lang] = count
+            return 'en', None
+        # 高频词法：关键词均为整词，等价于在小写文本的 \w+ 分词集合中查表（同一语言列表中的重复词按次数计）
+        lang_hits = dict.fromkeys(self.lang_keywords, 0)
+        for word in set(_WORD_RE.findall(text.lower())):
+            for lang in self._keyword_index.get(word, ()):
+                lang_hits[lang] += 1
         if lang_hits:
             max_count = max(lang_hits.values())
             if max_count > 0:
                 candidates = [lang for lang, cnt in lang_hits.items() if cnt == max_count]
                 if len(candidates) == 1:
                     logger.info(f"[LanguageDetector] 高频词法判定为: {candidates[0]}")
-                    return candidates[0]
-        # fastText
-        ft_cfg = self.config_manager.get('fasttext', {})
-        enabled = ft_cfg.get('enabled', True)
-        threshold = float(ft_cfg.get('confidence_threshold', 0.8))
-        if enabled and self.fasttext_model:
-            try:
-                pred = self.fasttext_model.predict(text.replace("\n", " ")[:512])
-                lang = pred[0][0].replace("__label__", "")
-                prob = float(pred[1][0]) if pred and len(pred) > 1 and len(pred[1]) > 0 else 0.0
-                logger.info(f"[LanguageDetector] fasttext 预测: lang={lang}, prob={prob}")
-                if prob >= threshold:
-                    return lang
-                if lang == 'en' and prob < 0.9 and chinese_chars_count > 0:
-                    logger.info("[LanguageDetector] fasttext 低置信度英文+含中文，判定为中文")
-                    return 'zh'
-            except Exception as e:
-                logger.error(f"[LanguageDetector] fasttext 检测异常: {e}")
-                pass
+                    return candidates[0], None
+        return None, (chinese_chars_count, english_words_count)
+
+    def _fasttext_enabled(self):
+        return self.config_manager.get('fasttext', {}).get('enabled', True) and self.fasttext_model is not None
+
+    @staticmethod
+    def _fasttext_input(text):
+        return text.replace("\n", " ")[:512]
+
+    @staticmethod
+    def _parse_prediction(labels, probs):
+        lang = labels[0].replace("__label__", "")
+        prob = float(probs[0]) if len(probs) > 0 else 0.0
+        return lang, prob
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            workers = int(self.config_manager.get('fasttext', {}).get('workers', 1))
+            self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fasttext")
+        return self._executor
+
+    async def _predict_batched(self, line):
+        """
+        将文本加入批处理队列并等待预测结果；同时运行的批处理协程数不超过 workers
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((line, fut))
+        workers = max(1, int(self.config_manager.get('fasttext', {}).get('workers', 1)))
+        if self._drainers < workers:
+            self._drainers += 1
+            loop.create_task(self._drain())
+        return await fut
+
+    async def _drain(self):
+        """
+        批处理协程：每次从队列取出至多 max_batch 条文本，在线程池中执行一次 predict(list)，
+        推理期间新到的文本在队列中累积，下一轮一并处理
+        """
+        loop = asyncio.get_running_loop()
+        max_batch = max(1, int(self.config_manager.get('fasttext', {}).get('max_batch', 32)))
+        try:
+            # 让同一轮事件循环中到达的请求一并入队
+            await asyncio.sleep(0)
+            while self._pending:
+                chunk = self._pending[:max_batch]
+                del self._pending[:max_batch]
+                try:
+                    labels, probs = await loop.run_in_executor(
+                        self._get_executor(), self.fasttext_model.predict, [line for line, _ in chunk]
+                    )
+                except Exception as e:
+                    for _, fut in chunk:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                self.batches += 1
+                self.batched_texts += len(chunk)
+                for (_, fut), item_labels, item_probs in zip(chunk, labels, probs):
+                    if not fut.done():
+                        fut.set_result(self._parse_prediction(item_labels, item_probs))
+        finally:
+            self._drainers -= 1
+
+    def _resolve(self, text, counts, pred):
+        """
+        fastText 预测结果（可能为 None）与兜底规则
+        """
+        chinese_chars_count, english_words_count = counts
+        if pred is not None:
+            lang, prob = pred
+            threshold = float(self.config_manager.get('fasttext', {}).get('confidence_threshold', 0.8))
+            logger.info(f"[LanguageDetector] fasttext 预测: lang={lang}, prob={prob}")
+            if prob >= threshold:
+                return lang
+            if lang == 'en' and prob < 0.9 and chinese_chars_count > 0:
+                logger.info("[LanguageDetector] fasttext 低置信度英文+含中文，判定为中文")
+                return 'zh'
         # fallback
         if chinese_chars_count > 0 and english_words_count > 0:
             logger.info("[LanguageDetector] 中英混合，返回 ['zh', 'en']")
@@ -186,3 +414,17 @@ class LanguageDetector:
             return 'en'
         logger.warning("[LanguageDetector] 未能检测出语言，返回 unknown")
         return 'unknown'
+
+    def stats(self):
+        return {
+            "fasttext_loaded": self.fasttext_model is not None,
+            "fasttext_load_s": round(self.model_load_seconds, 2) if self.model_load_seconds is not None else None,
+            "fasttext_batches": self.batches,
+            "fasttext_texts": self.batched_texts,
+            "avg_batch": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+            "queued": len(self._pending),
+            "memo_entries": len(self._memo),
+            "memo_hits": self.memo_hits,
+            "memo_misses": self.memo_misses,
+            "memo_hit_rate": round(self.memo_hits / (self.memo_hits + self.memo_misses), 4) if self.memo_hits + self.memo_misses else 0.0,
+        }
@@ -0,0 +1,323 @@
+"""
+outbound.py
+出站消息调度模块：优先级队列、按群速率限制与 FloodWait 暂停、积压译文合并
+"""
+
+import asyncio
+import itertools
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class OutboundItem:
+    """
+    一条待发送的回复或待执行的回复编辑（message 为被编辑的消息）；
+    seq 为当前有效的队列序号，出队时与队列条目不一致（已合并、已重新入队）则跳过
+    """
+    __slots__ = ("event", "message", "chat_id", "text", "kind", "future", "enqueued", "seq")
+
+    def __init__(self, event, text, kind, future, enqueued, message=None):
+        self.event = event
+        self.message = message
+        self.chat_id = getattr(event if message is None else message, "chat_id", None)
+        self.text = text
+        self.kind = kind
+        self.future = future
+        self.enqueued = enqueued
+        self.seq = None
+
+class _ChatState:
+    __slots__ = ("recent", "pending", "held", "paused_until")
+
+    def __init__(self):
+        self.recent = deque()  # 最近 busy_window 秒内的发送时间
+        self.pending = []      # 未发送的译文条目（按入队顺序）
+        self.held = []         # 暂停期间（FloodWait 或该群速率窗口已满）出队的条目
+        self.paused_until = 0.0
+
+class OutboundDispatcher:
+    """
+    所有回复与回复编辑经由此调度器发送：
+    - 优先级：命令回复 > 译文 > 编辑；同类中安静的群 > 繁忙的群（busy_window 秒内发送超过 busy_threshold 条），同级按入队顺序
+    - 取出后先向速率限制器非阻塞地申请名额：该群窗口已满时暂停该群，消息保留到窗口空出后重新入队，
+      发送协程立即处理其他群，不会被一个繁忙的群占满；仅全局窗口受限时放回队列，稍后按优先级重新取出
+    - FloodWaitError 同样只暂停对应的群（含编辑），到期后重新入队，其他群不受影响
+    - 某群积压的译文（含暂停期间积压的）达到 coalesce_threshold 条时，合并为一条回复（回复最新一条原消息）发送
+    - 记录从入队到发送完成的排队延迟
+    """
+    COMMAND = 0
+    TRANSLATION = 1
+    EDIT = 2
+
+    def __init__(self, send_func, edit_func=None, rate_limiter=None, workers=4, busy_threshold=10, busy_window=60,
+                 coalesce_threshold=5, max_coalesce_chars=3500, max_flood_wait=600, latency_window=500):
+        self._send_func = send_func
+        self._edit_func = edit_func
+        self.rate_limiter = rate_limiter
+        self.workers = max(1, int(workers))
+        self.busy_threshold = max(1, int(busy_threshold))
+        self.busy_window = float(busy_window)
+        self.coalesce_threshold = max(2, int(coalesce_threshold))
+        self.max_coalesce_chars = int(max_coalesce_chars)
+        self.max_flood_wait = float(max_flood_wait)
+        self._queue = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self._chats = {}
+        self._last_sweep = 0.0
+        self._latencies = deque(maxlen=int(latency_window))
+        self.sent = 0
+        self.edited = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.flood_waits = 0
+        self.rate_pauses = 0
+        self.max_latency = 0.0
+
+    @classmethod
+    def from_config(cls, cfg, send_func, edit_func=None, rate_limiter=None):
+        cfg = cfg or {}
+        return cls(
+            send_func,
+            edit_func=edit_func,
+            rate_limiter=rate_limiter,
+            workers=cfg.get("workers", 4),
+            busy_threshold=cfg.get("busy_threshold", 10),
+            busy_window=cfg.get("busy_window", 60),
+            coalesce_threshold=cfg.get("coalesce_threshold", 5),
+            max_coalesce_chars=cfg.get("max_coalesce_chars", 3500),
+            max_flood_wait=cfg.get("max_flood_wait", 600),
+        )
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"[OutboundDispatcher] 启动 {self.workers} 个发送协程")
+
+    def _chat(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState()
+        return state
+
+    def _trim_recent(self, state, now):
+        recent = state.recent
+        while recent and now - recent[0] >= self.busy_window:
+            recent.popleft()
+
+    def _is_busy(self, state, now):
+        self._trim_recent(state, now)
+        return len(state.recent) + len(state.pending) >= self.busy_threshold
+
+    def _enqueue(self, item, now):
+        state = self._chat(item.chat_id)
+        item.seq = next(self._seq)
+        rank = 1 if self._is_busy(state, now) else 0
+        self._queue.put_nowait(((item.kind, rank, item.seq), item))
+
+    async def submit(self, event, text, kind=TRANSLATION):
+        """
+        提交一条回复并等待发送完成，返回发送的消息；发送失败或被合并到其他回复时返回 None
+        """
+        self._start()
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._maybe_sweep(now)
+        item = OutboundItem(event, text, kind, loop.create_future(), now)
+        if kind == self.TRANSLATION:
+            self._chat(item.chat_id).pending.append(item)
+        self._enqueue(item, now)
+        return await item.future
+
+    async def edit(self, message, text):
+        """
+        提交一次回复编辑并等待完成，返回是否编辑成功；与回复共用速率限制与 FloodWait 暂停
+        """
+        self._start()
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._maybe_sweep(now)
+        item = OutboundItem(None, text, self.EDIT, loop.create_future(), now, message=message)
+        self._enqueue(item, now)
+        return bool(await item.future)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await self._queue.get()
+            (_, _, seq), item = entry
+            if item.seq != seq or item.future.done():
+                continue
+            state = self._chat(item.chat_id)
+            now = loop.time()
+            if state.paused_until > now:
+                item.seq = None
+                state.held.append(item)
+                continue
+            if self.rate_limiter is not None:
+                blocked = self.rate_limiter.try_acquire(item.chat_id)
+                if blocked is not None:
+                    chat_at, global_at = blocked
+                    if chat_at > now:
+                        self.rate_pauses += 1
+                        self._hold(item.chat_id, state, [item], chat_at)
+                    else:
+                        # 全局窗口很短（默认 1 秒）：放回队列，到期后重新按优先级取出
+                        self._queue.put_nowait(entry)
+                        await asyncio.sleep(max(0.0, global_at - now))
+                    continue
+            batch = self._collect(item, state)
+            try:
+                await self._send(batch, state)
+            except Exception as e:
+                logger.error(f"[OutboundDispatcher] 发送协程异常: {e}")
+
+    def _collect(self, item, state):
+        """
+        该群积压的译文达到阈值时，合并所有积压译文（总长不超过 max_coalesce_chars）
+        """
+        if item.kind != self.TRANSLATION:
+            return [item]
+        live = [p for p in state.pending if not p.future.done() and (p.seq is not None or p is item)]
+        if len(live) < self.coalesce_threshold:
+            return [item]
+        batch = []
+        size = 0
+        for p in live:
+            if batch and size + len(p.text) + 2 > self.max_coalesce_chars:
+                break
+            batch.append(p)
+            size += len(p.text) + 2
+        if item not in batch:
+            return [item]
+        for p in batch:
+            p.seq = None
+        return batch
+
+    async def _send(self, batch, state):
+        loop = asyncio.get_running_loop()
+        lead = batch[-1]
+        text = "\n\n".join(p.text for p in batch) if len(batch) > 1 else lead.text
+        try:
+            if lead.message is not None:
+                message = await self._edit_func(lead.message, text)
+            else:
+                message = await self._send_func(lead.event, text)
+        except Exception as e:
+            seconds = self._flood_wait_seconds(e)
+            if seconds is not None and seconds <= self.max_flood_wait:
+                self._pause(lead.chat_id, state, batch, seconds)
+                return
+            self.failed += len(batch)
+            if lead.message is not None:
+                # 内容未变化等编辑失败不影响后续发送
+                logger.warning(f"[OutboundDispatcher] 编辑回复失败: {e}")
+            else:
+                logger.error(f"[OutboundDispatcher] 发送失败: {e}")
+            self._finish(batch, state, None)
+            return
+        now = loop.time()
+        state.recent.append(now)
+        if lead.message is not None:
+            self.edited += 1
+        else:
+            self.sent += 1
+        if len(batch) > 1:
+            self.coalesced += len(batch) - 1
+            logger.info(f"[OutboundDispatcher] chat={lead.chat_id} 积压 {len(batch)} 条译文已合并发送")
+        for p in batch:
+            latency = now - p.enqueued
+            self._latencies.append(latency)
+            self.max_latency = max(self.max_latency, latency)
+        # 合并发送的回复对应多条原消息，不返回给调用方（不参与编辑追踪）
+        self._finish(batch, state, message if len(batch) == 1 else None)
+
+    @staticmethod
+    def _flood_wait_seconds(error):
+        try:
+            from telethon.errors import FloodWaitError
+        except ImportError:
+            return None
+        if isinstance(error, FloodWaitError):
+            return float(getattr(error, "seconds", 0) or 0)
+        return None
+
+    def _pause(self, chat_id, state, batch, seconds):
+        loop = asyncio.get_running_loop()
+        self.flood_waits += 1
+        self._hold(chat_id, state, batch, loop.time() + seconds)
+        logger.warning(f"[OutboundDispatcher] chat={chat_id} 触发 FloodWait，暂停该群发送 {seconds:.0f} 秒")
+
+    def _hold(self, chat_id, state, batch, resume_at):
+        """
+        暂停该群到 resume_at，batch 放回暂存区队首；暂停期间该群出队的消息同样暂存，到期后一起重新入队
+        """
+        loop = asyncio.get_running_loop()
+        if resume_at > state.paused_until:
+            state.paused_until = resume_at
+            loop.call_at(resume_at, self._resume, chat_id)
+        for p in batch:
+            p.seq = None
+        state.held[:0] = batch
+
+    def _resume(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is None:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if state.paused_until > now:
+            return
+        held, state.held = state.held, []
+        for item in held:
+            if not item.future.done():
+                self._enqueue(item, now)
+        logger.info(f"[OutboundDispatcher] chat={chat_id} 恢复发送，重新入队 {len(held)} 条")
+
+    def _finish(self, batch, state, message):
+        for p in batch:
+            if not p.future.done():
+                p.future.set_result(message)
+        state.pending = [p for p in state.pending if not p.future.done()]
+
+    def _maybe_sweep(self, now):
+        """
+        每 busy_window 秒清理一次无积压、无暂停且近期无发送的群状态
+        """
+        if now - self._last_sweep < self.busy_window:
+            return
+        self._last_sweep = now
+        idle = []
+        for chat_id, state in self._chats.items():
+            self._trim_recent(state, now)
+            if not state.pending and not state.held and not state.recent and state.paused_until <= now:
+                idle.append(chat_id)
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        stats = {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "sent": self.sent,
+            "edited": self.edited,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "flood_waits": self.flood_waits,
+            "rate_pauses": self.rate_pauses,
+            "paused_chats": sum(1 for state in self._chats.values() if state.held),
+        }
+        if latencies:
+            stats["latency_avg_ms"] = round(sum(latencies) / len(latencies) * 1000, 1)
+            stats["latency_p95_ms"] = round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000, 1)
+            stats["latency_max_ms"] = round(self.max_latency * 1000, 1)
+        return stats
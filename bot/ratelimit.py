@@ -0,0 +1,117 @@
+"""
+ratelimit.py
+发送消息速率限制模块（每群 + 全局滑动窗口）
+"""
+
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class SlidingWindow:
+    """
+    精确滑动窗口：任意 window 秒内最多 limit 次；deque 只保存窗口内的时间戳
+    """
+    __slots__ = ("limit", "window", "times")
+
+    def __init__(self, limit, window):
+        self.limit = max(1, int(limit))
+        self.window = float(window)
+        self.times = deque()
+
+    def _trim(self, now):
+        times = self.times
+        while times and now - times[0] >= self.window:
+            times.popleft()
+
+    def available_at(self, now):
+        """
+        下一次允许发送的时间点（<= now 表示立即可发）
+        """
+        self._trim(now)
+        if len(self.times) < self.limit:
+            return now
+        return self.times[0] + self.window
+
+    def record(self, now):
+        self.times.append(now)
+
+    def idle(self, now):
+        self._trim(now)
+        return not self.times
+
+class RateLimiter:
+    """
+    每群 per_chat 次/per_chat_window 秒 + 全局 global_limit 次/global_window 秒的发送限制：
+    非阻塞申请，受限时返回各窗口的可放行时间，由出站调度器暂存或延后对应消息，限制器本身不持有等待者；
+    空闲群的窗口每 sweep_interval 秒清理一次，避免按群无限增长
+    """
+    def __init__(self, per_chat=19, per_chat_window=60, global_limit=29, global_window=1, sweep_interval=300):
+        self.per_chat = max(1, int(per_chat))
+        self.per_chat_window = float(per_chat_window)
+        self.sweep_interval = float(sweep_interval)
+        self._global = SlidingWindow(global_limit, global_window)
+        self._chats = {}
+        self._last_sweep = 0.0
+        self.granted = 0
+        self.deferred = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            per_chat=cfg.get("per_chat", 19),
+            per_chat_window=cfg.get("per_chat_window", 60),
+            global_limit=cfg.get("global", 29),
+            global_window=cfg.get("global_window", 1),
+            sweep_interval=cfg.get("sweep_interval", 300),
+        )
+
+    def _chat(self, key):
+        window = self._chats.get(key)
+        if window is None:
+            window = self._chats[key] = SlidingWindow(self.per_chat, self.per_chat_window)
+        return window
+
+    def try_acquire(self, key):
+        """
+        不等待的占用：该群与全局窗口都有余量时立即占用一次名额并返回 None；
+        否则不占用，返回 (该群可放行时间, 全局可放行时间)，不大于当前时间表示该窗口不受限。
+        出站调度器在发送前调用，被限制的群由调度器暂存，不占用发送协程
+        """
+        now = asyncio.get_running_loop().time()
+        self._maybe_sweep(now)
+        chat = self._chat(key)
+        chat_at = chat.available_at(now)
+        global_at = self._global.available_at(now)
+        if chat_at <= now and global_at <= now:
+            chat.record(now)
+            self._global.record(now)
+            self.granted += 1
+            return None
+        self.deferred += 1
+        return chat_at, global_at
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        idle = [key for key, window in self._chats.items() if window.idle(now)]
+        for key in idle:
+            del self._chats[key]
+        if idle:
+            self.evicted += len(idle)
+            logger.info(f"[RateLimiter] 清理空闲群窗口 {len(idle)} 个，剩余 {len(self._chats)} 个")
+
+    def stats(self):
+        """
+        名额占用统计；排队延迟与因速率限制暂停的次数见出站调度器统计（outbound.latency_*、rate_pauses）
+        """
+        return {
+            "granted": self.granted,
+            "deferred": self.deferred,
+            "chats": len(self._chats),
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,465 @@
+"""
+rule_store.py
+规则持久化模块：JSON 快照 + 追加式变更日志，或 SQLite 数据库；均由后台线程延迟合并写入
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()
+_STOP = object()
+
+def apply_op(rules, op):
+    """
+    将一条变更应用到 group_id -> user_id -> [规则] 的 dict 上；所有变更均为幂等的整体赋值/删除
+    """
+    kind = op.get("op")
+    gid = op.get("gid")
+    if kind == "set":
+        rules.setdefault(gid, {})[op["uid"]] = op["rules"]
+    elif kind == "del":
+        users = rules.get(gid)
+        if users is not None:
+            users.pop(op["uid"], None)
+            if not users:
+                del rules[gid]
+    elif kind == "del_chat":
+        rules.pop(gid, None)
+    elif kind == "clear":
+        rules.clear()
+
+class _BackgroundRuleStore(ABC):
+    """
+    规则存储的公共部分：提交的变更只入队，由后台线程在 debounce 秒内合并后调用 _write_batch 一次写入，
+    不阻塞事件循环；flush/close 时立即写入。写入失败需要重试时，_retry_delay 返回重试间隔，
+    后台线程在空闲该时长后调用 _retry
+    """
+    backend = None
+
+    def __init__(self, debounce=1.0):
+        self.debounce = float(debounce)
+        self._queue = queue.Queue()
+        self._thread = None
+        self.writes = 0
+        self.ops_written = 0
+        self.errors = 0
+
+    def record(self, ops, snapshot):
+        """
+        提交一次事务的变更（在调用线程中只做入队）；snapshot 为提交后的规则快照，压缩时写入
+        """
+        if not ops:
+            return
+        self._ensure_thread()
+        self._queue.put((ops, snapshot))
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="rule-store", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._retry_delay())
+            except queue.Empty:
+                self._retry()
+                continue
+            if item is _STOP:
+                self._retry_pending()
+                return
+            batch = []
+            waiters = []
+            stop = False
+            deadline = time.monotonic() + self.debounce
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, tuple) and item[0] is _FLUSH:
+                    waiters.append(item[1])
+                else:
+                    batch.append(item)
+                # 收到 flush/stop 时不再等待，立即写入
+                remaining = 0 if (waiters or stop) else deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            if waiters or stop:
+                self._retry_pending()
+            for event in waiters:
+                event.set()
+            if stop:
+                return
+
+    def _retry_pending(self):
+        if self._retry_delay() is not None:
+            self._retry()
+
+    @abstractmethod
+    def _write_batch(self, batch):
+        pass
+
+    def _retry_delay(self):
+        """
+        有待重试的写入时返回重试间隔（秒），否则返回 None
+        """
+        return None
+
+    def _retry(self):
+        pass
+
+    def flush(self, timeout=10):
+        """
+        阻塞等待队列中的变更全部写入（关闭前调用）
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return
+        event = threading.Event()
+        self._queue.put((_FLUSH, event))
+        event.wait(timeout)
+
+    def close(self, timeout=10):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "pending": self._queue.qsize(),
+            "writes": self.writes,
+            "ops_written": self.ops_written,
+            "errors": self.errors,
+        }
+
+class JsonRuleStore(_BackgroundRuleStore):
+    """
+    dynamic_rules.json 为完整快照，<path>.journal 为快照之后的变更日志（每行一条 JSON）：
+    - 规则变更只把变更放入队列，由后台线程在 debounce 秒内合并后一次追加写入日志，不阻塞事件循环
+    - 日志超过 compact_entries 条时压缩：完整快照写入临时文件、fsync 后 os.replace 原子替换，再清空日志
+    - 启动时加载快照并重放日志；变更均为幂等整体赋值，压缩中途崩溃时重放旧日志也不会出错
+    """
+    backend = "json"
+
+    def __init__(self, path, debounce=1.0, compact_entries=500, fsync=True):
+        super().__init__(debounce)
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.compact_entries = max(1, int(compact_entries))
+        self.fsync = bool(fsync)
+        self._journal_entries = 0
+        self._needs_compact = False
+        # 规则文件损坏且无法备份时为 True，不再写入以免覆盖
+        self._write_disabled = False
+        self.compactions = 0
+
+    @classmethod
+    def from_config(cls, path, cfg):
+        cfg = cfg or {}
+        return cls(
+            path,
+            debounce=cfg.get("debounce", 1.0),
+            compact_entries=cfg.get("compact_entries", 500),
+            fsync=cfg.get("fsync", True),
+        )
+
+    def read(self):
+        """
+        只读加载：读取快照并重放变更日志（遇到损坏行停止），不备份、不压缩、不改动任何文件；
+        返回 (规则, 日志条数, 已重放条数, 快照解析异常或 None)
+        """
+        rules = {}
+        error = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    rules = json.load(f)
+                logger.info(f"[JsonRuleStore] 规则文件加载成功: {self.path}")
+            except Exception as e:
+                error = e
+                rules = {}
+        else:
+            logger.warning(f"[JsonRuleStore] 规则文件不存在: {self.path}")
+        replayed = 0
+        entries = 0
+        broken = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entries += 1
+                    if broken:
+                        continue
+                    try:
+                        apply_op(rules, json.loads(line))
+                        replayed += 1
+                    except Exception as e:
+                        # 崩溃时可能写了半行，之后的内容忽略
+                        logger.warning(f"[JsonRuleStore] 变更日志第 {entries} 条损坏，停止重放: {e}")
+                        broken = True
+        return rules, entries, replayed, error
+
+    def load(self):
+        rules, entries, replayed, error = self.read()
+        if error is not None:
+            # 无法解析的快照先改名备份，之后的压缩不会覆盖它
+            backup = f"{self.path}.corrupt.{int(time.time())}"
+            logger.error(f"[JsonRuleStore] 规则文件加载失败: {error}，已备份为 {backup}")
+            try:
+                os.replace(self.path, backup)
+            except Exception as err:
+                logger.error(f"[JsonRuleStore] 规则文件备份失败，本次运行不写入规则文件: {err}")
+                self._write_disabled = True
+        self._journal_entries = entries
+        if entries:
+            # 日志非空（含损坏行）时一律压缩并清空，新的变更不会追加在损坏行之后
+            logger.info(f"[JsonRuleStore] 重放变更日志 {replayed}/{entries} 条，立即压缩")
+            self._write_snapshot(rules)
+        return rules
+
+    def _write_batch(self, batch):
+        if self._write_disabled:
+            logger.error("[JsonRuleStore] 规则文件损坏且未能备份，本次变更未保存")
+            self.errors += 1
+            return
+        ops = [op for item_ops, _ in batch for op in item_ops]
+        snapshot = batch[-1][1]
+        if not self._needs_compact and self._journal_entries + len(ops) <= self.compact_entries:
+            try:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                self._journal_entries += len(ops)
+                self.writes += 1
+                self.ops_written += len(ops)
+                logger.info(f"[JsonRuleStore] 追加变更日志 {len(ops)} 条（合并 {len(batch)} 次提交）")
+                return
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"[JsonRuleStore] 变更日志写入失败，改为写入完整快照: {e}")
+        self._write_snapshot(snapshot.to_dict())
+
+    def _write_snapshot(self, rules):
+        if self._write_disabled:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(rules, f, ensure_ascii=False, indent=2)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # 快照已包含日志中的全部变更；此处崩溃时重放旧日志结果相同
+            with open(self.journal_path, 'w', encoding='utf-8'):
+                pass
+            self._journal_entries = 0
+            self._needs_compact = False
+            self.compactions += 1
+            logger.info(f"[JsonRuleStore] 规则文件保存成功（压缩）: {self.path}")
+        except Exception as e:
+            self._needs_compact = True
+            self.errors += 1
+            logger.error(f"[JsonRuleStore] 规则文件保存失败: {e}")
+
+    def stats(self):
+        stats = super().stats()
+        stats["journal_entries"] = self._journal_entries
+        stats["compactions"] = self.compactions
+        return stats
+
+class SqliteRuleStore(_BackgroundRuleStore):
+    """
+    基于 SQLite 的规则存储，适合数千个 (会话, 用户) 的规则集：
+    - 每个 (会话, 用户) 一行，规则列表以 JSON 保存；变更只改动相关行，不再整体重写
+    - WAL 模式；主键 (chat_id, user_id) 覆盖按会话查询，另建 user_id 索引用于按用户查询
+    - 首次打开且数据库为空时，从 dynamic_rules.json（含未压缩的变更日志）迁移，迁移只进行一次
+    - 写入同样由后台线程在 debounce 秒内合并为一个事务；事务失败（数据库被锁、磁盘已满）时不丢弃，
+      每 retry_interval 秒用最新快照整体重写一次，直到成功
+    """
+    backend = "sqlite"
+
+    def __init__(self, path="dynamic_rules.db", json_path=None, debounce=1.0, fsync=True, retry_interval=5.0):
+        super().__init__(debounce)
+        self.path = path
+        self.json_path = json_path
+        self.retry_interval = float(retry_interval)
+        self._lock = threading.Lock()
+        # 写入失败后待整体重写的最新快照
+        self._resync = None
+        self.migrated = 0
+        self.resyncs = 0
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rules ("
+            " chat_id TEXT NOT NULL, user_id TEXT NOT NULL,"
+            " rules TEXT NOT NULL, updated REAL NOT NULL,"
+            " PRIMARY KEY (chat_id, user_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rules_user ON rules(user_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        logger.info(f"[SqliteRuleStore] 规则数据库已打开: {self.path}")
+
+    @classmethod
+    def from_config(cls, path, cfg):
+        cfg = cfg or {}
+        return cls(
+            path=cfg.get("sqlite_path", "dynamic_rules.db"),
+            json_path=path,
+            debounce=cfg.get("debounce", 1.0),
+            fsync=cfg.get("fsync", True),
+            retry_interval=cfg.get("retry_interval", 5.0),
+        )
+
+    def load(self):
+        self._migrate()
+        rules = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT chat_id, user_id, rules FROM rules").fetchall()
+        for gid, uid, raw in rows:
+            try:
+                rules.setdefault(gid, {})[uid] = json.loads(raw)
+            except Exception as e:
+                logger.error(f"[SqliteRuleStore] 规则解析失败: chat_id={gid}, user_id={uid}, {e}")
+        logger.info(f"[SqliteRuleStore] 规则加载成功: {len(rows)} 条 (会话, 用户) 规则")
+        return rules
+
+    def _migrate(self):
+        """
+        从 dynamic_rules.json（含变更日志）导入规则，只读，不压缩、不改动原文件；
+        已迁移过（meta 中有记录）或数据库非空时跳过，快照无法解析时本次不迁移，修复后下次启动再导入
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+            count = self._conn.execute("SELECT COUNT(*) FROM rules").fetchone()[0]
+        if done is not None or count or not self.json_path or not os.path.exists(self.json_path):
+            return
+        rules, _, _, error = JsonRuleStore(self.json_path).read()
+        if error is not None:
+            logger.error(f"[SqliteRuleStore] {self.json_path} 无法解析，跳过迁移: {error}")
+            return
+        now = time.time()
+        rows = [
+            (str(gid), str(uid), json.dumps(rule_list, ensure_ascii=False), now)
+            for gid, users in rules.items() for uid, rule_list in (users or {}).items() if rule_list
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO rules VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('migrated_from', ?)", (os.path.abspath(self.json_path),)
+                )
+        self.migrated = len(rows)
+        logger.info(f"[SqliteRuleStore] 已从 {self.json_path} 迁移 {len(rows)} 条规则（原文件保留）")
+
+    def _write_batch(self, batch):
+        if self._resync is not None:
+            # 之前的变更未写入，逐条变更已不足以同步，直接用最新快照整体重写
+            self._resync = batch[-1][1]
+            self._retry()
+            return
+        ops = [op for item_ops, _ in batch for op in item_ops]
+        now = time.time()
+        try:
+            with self._lock:
+                with self._conn:
+                    for op in ops:
+                        kind = op.get("op")
+                        if kind == "set":
+                            self._conn.execute(
+                                "INSERT INTO rules (chat_id, user_id, rules, updated) VALUES (?, ?, ?, ?)"
+                                " ON CONFLICT(chat_id, user_id) DO UPDATE SET rules = excluded.rules,"
+                                " updated = excluded.updated",
+                                (op["gid"], op["uid"], json.dumps(op["rules"], ensure_ascii=False), now),
+                            )
+                        elif kind == "del":
+                            self._conn.execute(
+                                "DELETE FROM rules WHERE chat_id = ? AND user_id = ?", (op["gid"], op["uid"])
+                            )
+                        elif kind == "del_chat":
+                            self._conn.execute("DELETE FROM rules WHERE chat_id = ?", (op["gid"],))
+                        elif kind == "clear":
+                            self._conn.execute("DELETE FROM rules")
+            self.writes += 1
+            self.ops_written += len(ops)
+            logger.info(f"[SqliteRuleStore] 写入规则变更 {len(ops)} 条（合并 {len(batch)} 次提交）")
+        except Exception as e:
+            self.errors += 1
+            self._resync = batch[-1][1]
+            logger.error(f"[SqliteRuleStore] 规则变更写入失败，{self.retry_interval:.0f} 秒后整体重写: {e}")
+
+    def _retry_delay(self):
+        return self.retry_interval if self._resync is not None else None
+
+    def _retry(self):
+        """
+        用最新快照整体重写 rules 表（单个事务），成功后恢复逐条写入
+        """
+        snapshot = self._resync
+        if snapshot is None:
+            return
+        now = time.time()
+        rows = [
+            (gid, uid, json.dumps(rule_list, ensure_ascii=False), now)
+            for gid, users in snapshot.to_dict().items() for uid, rule_list in users.items()
+        ]
+        try:
+            with self._lock:
+                with self._conn:
+                    self._conn.execute("DELETE FROM rules")
+                    self._conn.executemany("INSERT INTO rules VALUES (?, ?, ?, ?)", rows)
+            self._resync = None
+            self.resyncs += 1
+            self.writes += 1
+            logger.info(f"[SqliteRuleStore] 已用最新快照整体重写 {len(rows)} 条规则")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[SqliteRuleStore] 整体重写失败，{self.retry_interval:.0f} 秒后重试: {e}")
+
+    def close(self, timeout=10):
+        super().close(timeout)
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                logger.warning(f"[SqliteRuleStore] 关闭失败: {e}")
+
+    def stats(self):
+        stats = super().stats()
+        stats["migrated"] = self.migrated
+        stats["resyncs"] = self.resyncs
+        stats["resync_pending"] = self._resync is not None
+        return stats
+
+def create_rule_store(path, cfg):
+    """
+    按 rules_storage.backend（json / sqlite）创建规则存储
+    """
+    cfg = cfg or {}
+    backend = str(cfg.get("backend", "json")).lower()
+    if backend == "sqlite":
+        return SqliteRuleStore.from_config(path, cfg)
+    if backend != "json":
+        logger.warning(f"[RuleStore] 未知的规则存储后端 {backend}，使用 json")
+    return JsonRuleStore.from_config(path, cfg)
@@ -3,101 +3,332 @@ rules.py
 动态规则管理模块
 """
 
-import json
 import threading
-import os
 import logging
+from contextlib import contextmanager
+from types import MappingProxyType
 
 logger = logging.getLogger(__name__)
 
+WILDCARD = "*"
+_EMPTY = frozenset()
+
+def _as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+class RuleSnapshot:
+    """
+    某一时刻全部规则的不可变快照，发布后不再修改，读取方无需加锁：
+    - rules: group_id -> user_id -> (规则dict, ...)，与 dynamic_rules.json 结构一致
+    - chat_index: group_id -> frozenset(user_id)
+    - targets: (group_id, user_id) -> {源语言: frozenset(目标语言)}，规则列表已展开合并
+    - resolve_index: (group_id, user_id, 检测语言) -> frozenset(目标语言)，已排除与检测语言相同的目标，
+      已并入源语言为通配符 * 的规则；原流程中 zh 的特判（dlang == "zh" and "zh" in source_langs）
+      与精确匹配等价，由同一个键覆盖
+    - wildcards: (group_id, user_id) -> 源语言为 * 的目标集合，用于索引中没有的检测语言
+    """
+    __slots__ = ("rules", "chat_index", "targets", "resolve_index", "wildcards", "_wildcard_memo", "_raw", "version")
+
+    def __init__(self, rules, version=0, base=None, touched=None):
+        """
+        base 与 touched 同时给出时增量构建：沿用 base 中未改动会话的索引，只重建 touched 中的会话
+        """
+        if base is None or touched is None:
+            frozen, chat_index, targets, resolve_index, wildcards = {}, {}, {}, {}, {}
+            gids = rules.keys()
+        else:
+            # 复制底层普通 dict（C 层整体复制，远快于逐项复制只读视图）
+            frozen, chat_index, targets, resolve_index, wildcards = (d.copy() for d in base._raw)
+            gids = touched
+            for gid in touched:
+                for uid in base.rules.get(gid, ()):
+                    for src in targets.pop((gid, uid), ()):
+                        resolve_index.pop((gid, uid, src), None)
+                    wildcards.pop((gid, uid), None)
+                frozen.pop(gid, None)
+                chat_index.pop(gid, None)
+        for gid in gids:
+            group = {}
+            for uid, rule_obj in (rules.get(gid) or {}).items():
+                rule_list = tuple(dict(rule) for rule in _as_list(rule_obj) if rule)
+                if not rule_list:
+                    continue
+                group[uid] = rule_list
+                self._index_user(gid, uid, rule_list, targets, resolve_index, wildcards)
+            if group:
+                frozen[gid] = MappingProxyType(group)
+                chat_index[gid] = frozenset(group)
+        self._raw = (frozen, chat_index, targets, resolve_index, wildcards)
+        self.rules = MappingProxyType(frozen)
+        self.chat_index = MappingProxyType(chat_index)
+        self.targets = MappingProxyType(targets)
+        self.resolve_index = MappingProxyType(resolve_index)
+        self.wildcards = MappingProxyType(wildcards)
+        # 通配符规则对未显式配置语言的解析结果，按需填充（同一快照内结果不变）
+        self._wildcard_memo = {}
+        self.version = version
+
+    @staticmethod
+    def _index_user(gid, uid, rule_list, targets, resolve_index, wildcards):
+        src_map = {}
+        for rule in rule_list:
+            tgts = _as_list(rule.get("target_langs", ["zh"]))
+            for src in _as_list(rule.get("source_langs", ["en"])):
+                src_map.setdefault(src, set()).update(tgts)
+        src_map = {src: frozenset(t) for src, t in src_map.items()}
+        targets[(gid, uid)] = MappingProxyType(src_map)
+        wild = src_map.get(WILDCARD, frozenset())
+        if wild:
+            wildcards[(gid, uid)] = wild
+        for src, tgts in src_map.items():
+            if src == WILDCARD:
+                continue
+            resolved = (tgts | wild) - {src}
+            if resolved:
+                resolve_index[(gid, uid, src)] = resolved
+
+    def resolve(self, group_id, user_id, lang):
+        """
+        检测语言为 lang 时应翻译到的目标语言集合（可能为空）
+        """
+        key = (group_id, user_id, lang)
+        targets = self.resolve_index.get(key)
+        if targets is not None:
+            return targets
+        wild = self.wildcards.get((group_id, user_id))
+        # 未能识别的语言（unknown）不适用通配符
+        if wild is None or lang == "unknown":
+            return _EMPTY
+        targets = self._wildcard_memo.get(key)
+        if targets is None:
+            targets = self._wildcard_memo[key] = wild - {lang}
+        return targets
+
+    def to_dict(self):
+        """
+        转换为可写入 JSON 的普通 dict（规则 dict 为副本）
+        """
+        return {
+            gid: {uid: [dict(rule) for rule in rule_list] for uid, rule_list in users.items()}
+            for gid, users in self.rules.items()
+        }
+
+class RuleTransaction:
+    """
+    规则写事务：在快照的工作副本上修改（按群写时复制），提交后整体生成新快照
+    """
+    def __init__(self, snapshot):
+        self._base = snapshot
+        self._rules = dict(snapshot.rules)
+        self._copied = set()
+        self.changed = False
+        # 改动过的会话；None 表示需要全量重建（清空）
+        self._touched = set()
+        # 幂等变更列表，提交后交给存储层持久化
+        self.ops = []
+
+    def _record(self, op):
+        # 同一 (会话, 用户) 的连续变更只保留最后一条
+        last = self.ops[-1] if self.ops else None
+        if last is not None and last["op"] in ("set", "del") and op["op"] in ("set", "del") \
+                and last["gid"] == op["gid"] and last["uid"] == op["uid"]:
+            self.ops[-1] = op
+        else:
+            self.ops.append(op)
+        self.changed = True
+
+    def _group(self, gid, create=False):
+        group = self._rules.get(gid)
+        if group is not None and gid in self._copied:
+            return group
+        if group is None and not create:
+            return None
+        group = self._rules[gid] = dict(group or {})
+        self._copied.add(gid)
+        if self._touched is not None:
+            self._touched.add(gid)
+        return group
+
+    def get(self, group_id, user_id):
+        group = self._rules.get(str(group_id)) or {}
+        return [dict(rule) for rule in group.get(str(user_id), ())]
+
+    def add_rule(self, group_id, user_id, rule, username=None):
+        """
+        多对多规则展开为单一源/目标规则并合并到现有规则，相同源/目标的规则被覆盖
+        """
+        gid = str(group_id)
+        uid = str(user_id)
+        rule_list = self.get(gid, uid)
+        for src in _as_list(rule.get("source_langs", [])):
+            for tgt in _as_list(rule.get("target_langs", [])):
+                if src == tgt:
+                    continue
+                r = {"source_langs": [src], "target_langs": [tgt]}
+                if username is not None:
+                    r["username"] = username
+                # 覆盖同样规则
+                for i, old in enumerate(rule_list):
+                    if old.get("source_langs") == [src] and old.get("target_langs") == [tgt]:
+                        rule_list[i] = r
+                        break
+                else:
+                    rule_list.append(r)
+        self.replace(gid, uid, rule_list)
+
+    def replace(self, group_id, user_id, rules):
+        """
+        整体替换 (会话, 用户) 的规则列表；空列表等同于移除
+        """
+        gid = str(group_id)
+        uid = str(user_id)
+        rule_list = tuple(dict(rule) for rule in _as_list(rules) if rule)
+        if not rule_list:
+            self.remove(gid, uid)
+            return
+        self._group(gid, create=True)[uid] = rule_list
+        self._record({"op": "set", "gid": gid, "uid": uid, "rules": [dict(rule) for rule in rule_list]})
+
+    def remove(self, group_id, user_id):
+        gid = str(group_id)
+        uid = str(user_id)
+        group = self._group(gid)
+        if group is not None and uid in group:
+            del group[uid]
+            if not group:
+                del self._rules[gid]
+            self._record({"op": "del", "gid": gid, "uid": uid})
+
+    def remove_chat(self, group_id):
+        gid = str(group_id)
+        if gid in self._rules:
+            del self._rules[gid]
+            self._copied.discard(gid)
+            if self._touched is not None:
+                self._touched.add(gid)
+            self._record({"op": "del_chat", "gid": gid})
+
+    def clear(self):
+        if self._rules:
+            self._rules = {}
+            self._copied = set()
+            self._touched = None
+            self._record({"op": "clear"})
+
+    def build(self):
+        return RuleSnapshot(self._rules, self._base.version + 1, base=self._base, touched=self._touched)
+
 class RuleManager:
     """
-    负责 dynamic_rules.json 的读写、增删查改
+    负责动态规则的读写、增删查改（存储于 dynamic_rules.json 或 SQLite，见 rules_storage.backend）
     支持多群/多用户/多规则
+    读取方直接访问当前不可变快照，无需加锁；写入方通过 transaction() 修改，提交时原子替换快照并保存一次
     """
-    def __init__(self, path='dynamic_rules.json'):
+    def __init__(self, path='dynamic_rules.json', storage_cfg=None):
         self.path = path
-        self._lock = threading.Lock()
+        # 仅用于串行化写事务，读取不加锁
+        self._write_lock = threading.Lock()
         logger.info(f"[RuleManager] 初始化，加载规则文件: {self.path}")
-        self._rules = self._load_rules()
-
-    def _load_rules(self):
-        if not os.path.exists(self.path):
-            logger.warning(f"[RuleManager] 规则文件不存在: {self.path}")
-            return {}
-        try:
-            with open(self.path, 'r', encoding='utf-8') as f:
-                rules = json.load(f)
-                logger.info(f"[RuleManager] 规则文件加载成功: {self.path}")
-                return rules
-        except Exception as e:
-            logger.error(f"[RuleManager] 规则文件加载失败: {e}")
-            return {}
-
-    def _save_rules(self):
-        try:
-            with open(self.path, 'w', encoding='utf-8') as f:
-                json.dump(self._rules, f, ensure_ascii=False, indent=2)
-            logger.info(f"[RuleManager] 规则文件保存成功: {self.path}")
-        except Exception as e:
-            logger.error(f"[RuleManager] 规则文件保存失败: {e}")
+        from .rule_store import create_rule_store
+        self.store = create_rule_store(path, storage_cfg)
+        self._snapshot = RuleSnapshot(self.store.load())
+
+    @property
+    def snapshot(self):
+        """
+        当前规则快照（不可变）
+        """
+        return self._snapshot
+
+    @contextmanager
+    def transaction(self):
+        """
+        写事务：with rule_manager.transaction() as txn: txn.add_rule(...) / txn.replace(...) / txn.remove(...)
+        正常退出时生成新快照、原子替换并提交一次持久化；抛出异常则放弃全部修改
+        """
+        with self._write_lock:
+            txn = RuleTransaction(self._snapshot)
+            yield txn
+            if not txn.changed:
+                return
+            snapshot = txn.build()
+            self._snapshot = snapshot
+            # 持久化由存储层在后台线程完成，这里只入队
+            self.store.record(txn.ops, snapshot)
+
+    def has_chat(self, group_id):
+        """
+        会话内是否存在任意规则
+        """
+        return str(group_id) in self._snapshot.chat_index
+
+    def is_tracked(self, group_id, user_id):
+        """
+        (会话, 用户) 是否配置了规则，仅做两次哈希查找
+        """
+        users = self._snapshot.chat_index.get(str(group_id))
+        return users is not None and str(user_id) in users
+
+    def get_targets(self, group_id, user_id):
+        """
+        (会话, 用户) 的 {源语言: frozenset(目标语言)}，无规则时返回 None；返回值只读
+        """
+        return self._snapshot.targets.get((str(group_id), str(user_id)))
+
+    def resolve(self, group_id, user_id, lang):
+        """
+        (会话, 用户, 检测语言) -> frozenset(目标语言)，规则变更时预先编译，查询为常数时间
+        """
+        return self._snapshot.resolve(str(group_id), str(user_id), lang)
 
     def get_rule(self, group_id, user_id):
-        with self._lock:
-            return self._rules.get(str(group_id), {}).get(str(user_id))
+        """
+        (会话, 用户) 的规则列表副本，无规则时返回 None
+        """
+        users = self._snapshot.rules.get(str(group_id))
+        if users is None:
+            return None
+        rule_list = users.get(str(user_id))
+        return [dict(rule) for rule in rule_list] if rule_list else None
 
     def set_rule(self, group_id, user_id, rule, username=None):
-        with self._lock:
-            gid = str(group_id)
-            uid = str(user_id)
-            logger.info(f"[RuleManager] 设置规则: group_id={gid}, user_id={uid}, rule={rule}, username={username}")
-            if gid not in self._rules:
-                self._rules[gid] = {}
-            orig = self._rules[gid].get(uid, [])
-            rule_list = orig if isinstance(orig, list) else [orig] if orig else []
-            # 支持多对多规则展开
-            srcs = rule.get("source_langs", [])
-            tgts = rule.get("target_langs", [])
-            if not isinstance(srcs, list):
-                srcs = [srcs]
-            if not isinstance(tgts, list):
-                tgts = [tgts]
-            for src in srcs:
-                for tgt in tgts:
-                    if src == tgt:
-                        continue
-                    r = {"source_langs": [src], "target_langs": [tgt]}
-                    if username is not None:
-                        r["username"] = username
-                    # 覆盖同样规则
-                    replaced = False
-                    for i, old in enumerate(rule_list):
-                        if old.get("source_langs") == [src] and old.get("target_langs") == [tgt]:
-                            rule_list[i] = r
-                            replaced = True
-                            break
-                    if not replaced:
-                        rule_list.append(r)
-            self._rules[gid][uid] = rule_list
-            self._save_rules()
+        logger.info(f"[RuleManager] 设置规则: group_id={group_id}, user_id={user_id}, rule={rule}, username={username}")
+        with self.transaction() as txn:
+            txn.add_rule(group_id, user_id, rule, username=username)
+
+    def replace_rules(self, group_id, user_id, rules):
+        logger.info(f"[RuleManager] 替换规则: group_id={group_id}, user_id={user_id}, rules={rules}")
+        with self.transaction() as txn:
+            txn.replace(group_id, user_id, rules)
 
     def remove_rule(self, group_id, user_id):
-        with self._lock:
-            gid = str(group_id)
-            uid = str(user_id)
-            logger.info(f"[RuleManager] 移除规则: group_id={gid}, user_id={uid}")
-            if gid in self._rules and uid in self._rules[gid]:
-                del self._rules[gid][uid]
-                if not self._rules[gid]:
-                    del self._rules[gid]
-                self._save_rules()
+        logger.info(f"[RuleManager] 移除规则: group_id={group_id}, user_id={user_id}")
+        with self.transaction() as txn:
+            txn.remove(group_id, user_id)
 
     def list_rules(self):
-        with self._lock:
-            return self._rules.copy()
+        """
+        全部规则的副本：group_id -> user_id -> [规则dict]
+        """
+        return self._snapshot.to_dict()
 
     def clear_all_rules(self):
-        with self._lock:
-            self._rules = {}
-            self._save_rules()
-            logger.info("[RuleManager] 已清空所有翻译规则")
+        with self.transaction() as txn:
+            txn.clear()
+        logger.info("[RuleManager] 已清空所有翻译规则")
+
+    def close(self):
+        """
+        等待未写入的变更落盘并停止后台写线程
+        """
+        self.store.flush()
+        self.store.close()
+
+    def stats(self):
+        stats = self.store.stats()
+        stats["chats"] = len(self._snapshot.rules)
+        stats["users"] = len(self._snapshot.targets)
+        stats["version"] = self._snapshot.version
+        return stats
@@ -0,0 +1,147 @@
+"""
+scheduler.py
+翻译请求全局并发调度模块
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+class SchedulerBusyError(Exception):
+    """
+    等待队列已满，拒绝新的请求（背压）
+    """
+    pass
+
+class ConcurrencyLimit:
+    """
+    带有界 FIFO 等待队列的并发限制器，记录队列深度与等待耗时
+    """
+    def __init__(self, name, max_concurrency, max_waiters):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_waiters = max(0, int(max_waiters))
+        self.active = 0
+        self._waiters = deque()
+        self.acquired = 0
+        self.rejected = 0
+        self.peak_waiters = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def acquire(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.acquired += 1
+            return
+        if len(self._waiters) >= self.max_waiters:
+            self.rejected += 1
+            raise SchedulerBusyError(f"{self.name} 等待队列已满({self.max_waiters})")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.peak_waiters = max(self.peak_waiters, len(self._waiters))
+        start = time.monotonic()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 名额已移交给本请求，取消时转交下一位
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+        waited = time.monotonic() - start
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.acquired += 1
+
+    def release(self):
+        # 名额直接移交给队首等待者，active 不变
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "limit": self.max_concurrency,
+            "queued": len(self._waiters),
+            "peak_queued": self.peak_waiters,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.acquired * 1000, 1) if self.acquired else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+class RequestScheduler:
+    """
+    服务级请求调度器：每个引擎一个并发上限，每个端点一个连接预算，
+    超出时进入有界等待队列，队列满则抛出 SchedulerBusyError
+    """
+    def __init__(self, engine_limits=None, per_endpoint=4, max_queue=100, default_engine_limit=8):
+        self.per_endpoint = int(per_endpoint)
+        self.max_queue = int(max_queue)
+        self.default_engine_limit = int(default_engine_limit)
+        self._engine_limits = {
+            name: ConcurrencyLimit(f"engine:{name}", limit, self.max_queue)
+            for name, limit in (engine_limits or {}).items()
+        }
+        self._endpoint_limits = {}
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        return cls(
+            engine_limits=cfg.get("engines", {}) or {},
+            per_endpoint=cfg.get("per_endpoint", 4),
+            max_queue=cfg.get("max_queue", 100),
+            default_engine_limit=cfg.get("default_engine", 8),
+        )
+
+    def _engine_limit(self, engine):
+        limit = self._engine_limits.get(engine)
+        if limit is None:
+            limit = ConcurrencyLimit(f"engine:{engine}", self.default_engine_limit, self.max_queue)
+            self._engine_limits[engine] = limit
+        return limit
+
+    def _endpoint_limit(self, endpoint):
+        limit = self._endpoint_limits.get(endpoint)
+        if limit is None:
+            limit = ConcurrencyLimit(f"endpoint:{endpoint}", self.per_endpoint, self.max_queue)
+            self._endpoint_limits[endpoint] = limit
+        return limit
+
+    @asynccontextmanager
+    async def engine_slot(self, engine):
+        limit = self._engine_limit(engine)
+        await limit.acquire()
+        try:
+            yield
+        finally:
+            limit.release()
+
+    @asynccontextmanager
+    async def endpoint_slot(self, endpoint):
+        limit = self._endpoint_limit(endpoint)
+        await limit.acquire()
+        try:
+            yield
+        finally:
+            limit.release()
+
+    def stats(self):
+        stats = {}
+        for limit in list(self._engine_limits.values()) + list(self._endpoint_limits.values()):
+            stats[limit.name] = limit.stats()
+        return stats
@@ -0,0 +1,120 @@
+"""
+segment.py
+长文本分段模块：按代码块、行、句子切分，保留代码块、链接和空白原样
+"""
+
+import re
+
+_CODE_BLOCK_RE = re.compile(r"```[\s\S]*?```")
+_URL_ONLY_RE = re.compile(r"^(?:https?://|www\.)\S+$", re.IGNORECASE)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?。！？；;])(\s*)")
+_HAS_LETTER_RE = re.compile(r"[^\W\d_]")
+
+def is_translatable(segment):
+    """
+    片段是否需要翻译：纯链接、行内代码、无任何文字（数字/符号/表情）的片段原样保留
+    """
+    core = segment.strip()
+    if not core or _URL_ONLY_RE.match(core):
+        return False
+    if core.startswith("`") and core.endswith("`") and len(core) > 1:
+        return False
+    return bool(_HAS_LETTER_RE.search(core))
+
+def _split_sentences(core, max_chars):
+    """
+    超长行按句末标点切分，相邻短句合并，使每段不超过 max_chars（单句超长时整句保留）
+    返回 [(段落, 其后的分隔空白)]
+    """
+    if len(core) <= max_chars:
+        return [(core, "")]
+    parts = _SENTENCE_SPLIT_RE.split(core)
+    chunks = []
+    current = ""
+    for i in range(0, len(parts), 2):
+        sentence = parts[i]
+        sep = parts[i + 1] if i + 1 < len(parts) else ""
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) > max_chars:
+            body = current.rstrip()
+            chunks.append((body, current[len(body):]))
+            current = ""
+        current += sentence + sep
+    if current:
+        body = current.rstrip()
+        chunks.append((body, current[len(body):]))
+    return chunks
+
+def _split_lines(chunk, max_chars, pieces):
+    for line in chunk.splitlines(keepends=True):
+        body = line.rstrip("\r\n")
+        eol = line[len(body):]
+        core = body.strip()
+        if not core:
+            pieces.append((line, False))
+            continue
+        lead = body[:len(body) - len(body.lstrip())]
+        trail = body[len(body.rstrip()):]
+        if lead:
+            pieces.append((lead, False))
+        for sentence, sep in _split_sentences(core, max_chars):
+            pieces.append((sentence, is_translatable(sentence)))
+            if sep:
+                pieces.append((sep, False))
+        if trail or eol:
+            pieces.append((trail + eol, False))
+
+def split_segments(text, max_chars=400):
+    """
+    将文本切分为 [(片段, 是否需要翻译)]，所有片段按顺序拼接即为原文
+    """
+    pieces = []
+    pos = 0
+    for m in _CODE_BLOCK_RE.finditer(text):
+        _split_lines(text[pos:m.start()], max_chars, pieces)
+        pieces.append((m.group(0), False))
+        pos = m.end()
+    _split_lines(text[pos:], max_chars, pieces)
+    return pieces
+
+def join_segments(pieces, translations):
+    """
+    按原顺序重组文本；translations 为 {片段: 译文}，缺失的片段保留原文
+    """
+    return "".join(
+        translations.get(piece, piece) if translatable else piece
+        for piece, translatable in pieces
+    )
+
+def line_translations(text, translated):
+    """
+    将整段原文与整段译文按非空行对齐，返回 {原文行: 译文行}；
+    非空行数不一致（引擎合并或拆分了行）时无法对齐，返回 None
+    """
+    src = [line.strip() for line in text.splitlines() if line.strip()]
+    dst = [line.strip() for line in translated.splitlines() if line.strip()]
+    if not src or len(src) != len(dst):
+        return None
+    mapping = {}
+    for line, result in zip(src, dst):
+        mapping.setdefault(line, result)
+    return mapping
+
+def changed_lines(mapping, new_text):
+    """
+    新文本中不在 mapping 内的非空行（去重，保持顺序），即编辑后新增或改动的行
+    """
+    return list(dict.fromkeys(
+        line.strip() for line in new_text.splitlines() if line.strip() and line.strip() not in mapping
+    ))
+
+def rebuild_lines(new_text, mapping):
+    """
+    按新文本的行结构用 mapping 逐行重组译文，保留空行与行首缩进
+    """
+    lines = []
+    for line in new_text.splitlines():
+        core = line.strip()
+        lines.append(line[:len(line) - len(line.lstrip())] + mapping[core] if core else "")
+    return "\n".join(lines)
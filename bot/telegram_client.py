@@ -10,6 +10,16 @@ logger = logging.getLogger(__name__)
 
 import time
 import asyncio
+from collections import OrderedDict
+
+# 语言代码 -> 回复中显示的语言名称
+LANG_NAMES = {
+    "en": "英语", "zh": "中文", "fr": "法语", "de": "德语", "ru": "俄语", "ja": "日语", "ko": "韩语", "ar": "阿拉伯语",
+    "hi": "印地语", "tr": "土耳其语", "fa": "波斯语", "uk": "乌克兰语", "es": "西班牙语", "it": "意大利语", "rm": "罗曼什语",
+    "pt": "葡萄牙语", "pl": "波兰语", "nl": "荷兰语", "sv": "瑞典语", "ro": "罗马尼亚语", "cs": "捷克语", "el": "希腊语",
+    "da": "丹麦语", "fi": "芬兰语", "hu": "匈牙利语", "he": "希伯来语", "bg": "保加利亚语", "sr": "塞尔维亚语",
+    "hr": "克罗地亚语", "sk": "斯洛伐克语", "sl": "斯洛文尼亚语", "no": "挪威语"
+}
 
 class TelegramBot:
     """
@@ -29,41 +39,86 @@ class TelegramBot:
         logger.info(f"[TelegramBot] 初始化，session={self.session_name}, api_id={self.api_id}")
         self.client = TelegramClient(self.session_name, self.api_id, self.api_hash)
 
-        # 消息速率限制
-        self._group_msg_times = {}  # group_id: [timestamps]
-        self._global_msg_times = []  # [timestamps]
-        self._rate_lock = asyncio.Lock()
-        self._group_limit = 19  # 每群每分钟
-        self._group_window = 60  # 秒
-        self._global_limit = 29  # 全局每秒
-        self._global_window = 1  # 秒
+        # 消息速率限制（每群 + 全局滑动窗口，事件驱动唤醒）
+        from .ratelimit import RateLimiter
+        self.rate_limiter = RateLimiter.from_config(self.config_manager.get("rate_limit", {}))
+        # 出站调度：所有回复（译文、命令回复）与回复编辑按优先级排队发送，发送前检查速率限制
+        from .outbound import OutboundDispatcher
+        from .utils import configure_outbound
+        self.outbound = OutboundDispatcher.from_config(
+            self.config_manager.get("outbound", {}), self._send_now,
+            edit_func=self._edit_now, rate_limiter=self.rate_limiter,
+        )
+        configure_outbound(self.outbound)
+
+        # 由配置派生的预编译对象，按配置版本号重建，热重载后整体原子替换
+        self._derived_config = None  # (config_version, ignore_matcher, my_tg_ids)
+
+        # 已回复消息的 LRU：(chat_id, msg_id) -> (原文, 回复消息, 回复文本, 译文)，用于编辑消息后原地更新译文；
+        # 只保存回复中实际显示的原文与译文，回复编辑成功后才替换
+        self._tracked_replies = OrderedDict()
+        # 正在重译的编辑：(chat_id, msg_id) -> 最新一次编辑的原文，用于丢弃过期的重译结果
+        self._pending_edits = {}
+
+    def _get_derived_config(self):
+        """
+        获取当前配置版本对应的派生对象（忽略词匹配器、指令白名单），仅在 .fy-reload 后重建一次
+        """
+        derived = self._derived_config
+        version = self.config_manager.version
+        if derived is None or derived[0] != version:
+            from .utils import build_ignore_matcher, parse_my_tg_ids
+            ignore_words = self.config_manager.get("ignore_words", [])
+            my_tg_ids = parse_my_tg_ids(self.config_manager.get("telegram", {}))
+            derived = (version, build_ignore_matcher(ignore_words), my_tg_ids)
+            self._derived_config = derived
+            logger.info(f"[TelegramBot] 配置派生对象已重建: version={version}, ignore_words={derived[1].size}")
+        return derived
+
+    def _get_ignore_matcher(self):
+        return self._get_derived_config()[1]
+
+    def _get_my_tg_ids(self):
+        return self._get_derived_config()[2]
 
     async def send_reply(self, event, text):
         """
-        速率限制下安全发送消息
-        """
-        group_id = str(getattr(event, "chat_id", ""))
-        now = time.time()
-        while True:
-            async with self._rate_lock:
-                # group限制
-                group_times = self._group_msg_times.setdefault(group_id, [])
-                group_times = [t for t in group_times if now - t < self._group_window]
-                if len(group_times) < self._group_limit:
-                    group_times.append(now)
-                    self._group_msg_times[group_id] = group_times
-                    # global限制
-                    self._global_msg_times = [t for t in self._global_msg_times if now - t < self._global_window]
-                    if len(self._global_msg_times) < self._global_limit:
-                        self._global_msg_times.append(now)
-                        break  # 可以发
-            await asyncio.sleep(0.1)
-            now = time.time()
-        try:
-            await event.reply(text)
+        经出站调度器发送译文回复，返回发送的消息；失败或被合并发送时返回 None
+        """
+        message = await self.outbound.submit(event, text)
+        if message is not None:
             logger.info("[TelegramBot] 回复消息成功（速率限制已检查）")
-        except Exception as e:
-            logger.error(f"[TelegramBot] 回复消息失败: {e}")
+        return message
+
+    async def _send_now(self, event, text):
+        """
+        出站调度器的实际发送函数（调度器已占用速率限制名额）；异常（含 FloodWaitError）交由调度器处理
+        """
+        return await event.reply(text)
+
+    async def _edit_now(self, message, text):
+        """
+        出站调度器的实际编辑函数，异常交由调度器处理
+        """
+        await self.client.edit_message(message.chat_id, message, text)
+        return True
+
+    def get_stats(self):
+        """
+        翻译服务统计 + 出站队列与发送速率统计，供 .fy-stats 展示
+        """
+        stats = self.translation_service.get_stats()
+        stats["outbound"] = self.outbound.stats()
+        stats["rate_limit"] = self.rate_limiter.stats()
+        stats["lang_detect"] = self.lang_detector.stats()
+        stats["rules"] = self.rule_manager.stats()
+        return stats
+
+    async def edit_reply(self, message, text):
+        """
+        经出站调度器编辑已发送的回复（同样计入速率限制，FloodWait 时随该群暂停），返回是否成功
+        """
+        return await self.outbound.edit(message, text)
 
     def register_handlers(self):
         """
@@ -72,6 +127,10 @@ class TelegramBot:
         logger.info("[TelegramBot] 注册消息和命令处理器")
         @self.client.on(events.NewMessage)
         async def on_new_message(event):
+            # 快速路径：既无规则、也不是白名单指令用户的消息直接丢弃，不做任何文本处理
+            sender_id = event.sender_id
+            if not self.rule_manager.is_tracked(event.chat_id, sender_id) and sender_id not in self._get_my_tg_ids():
+                return
             text = getattr(event.message, "text", "")
             # 兼容全角句号，统一转换为半角
             text_check = text.replace("。", ".") if text else text
@@ -83,6 +142,16 @@ class TelegramBot:
                 # 只有有规则时才输出日志
                 await self.handle_message(event)
 
+        @self.client.on(events.MessageEdited)
+        async def on_message_edited(event):
+            # 仅处理曾经回复过的消息，其余编辑事件直接丢弃
+            if (event.chat_id, event.message.id) not in self._tracked_replies:
+                return
+            try:
+                await self.handle_edit(event)
+            except Exception as e:
+                logger.error(f"[TelegramBot] 处理编辑消息失败: {e}")
+
     async def handle_message(self, event):
         """
         普通消息的自动翻译主流程
@@ -90,59 +159,192 @@ class TelegramBot:
         text = getattr(event.message, "text", "")
         if not text or text.strip().startswith(".fy-"):
             return
-        from .utils import should_ignore, build_ignore_patterns
-        ignore_words = self.config_manager.get("ignore_words", [])
-        ignore_patterns = build_ignore_patterns(ignore_words)
-        if should_ignore(text, ignore_patterns):
+        from .utils import should_ignore
+        if should_ignore(text, self._get_ignore_matcher()):
             return
+        plan = await self._plan_translation(event, text)
+        if plan is None:
+            return
+        prefer, all_targets, src2tgts = plan
+        # 流式模式（主引擎配置 stream: true）：仅单一目标语言时，先发出部分译文再逐步编辑
+        stream_cfg = self.config_manager.get(prefer, {}) or {}
+        if stream_cfg.get("stream", False) and len(all_targets) == 1:
+            src, tgt = next(iter(all_targets))
+            message, reply_text, translations = await self._stream_reply(event, text, src, tgt, prefer, stream_cfg)
+            self._track_reply(event, text, message, reply_text, translations)
+            return
+        translations = await self._translate_groups(text, src2tgts, prefer)
+        reply_text = self._format_reply(text, [(lang, translated) for _, lang, translated in translations])
+        if reply_text:
+            try:
+                message = await self.send_reply(event, reply_text)
+                logger.info("[TelegramBot] 回复翻译结果成功")
+                self._track_reply(event, text, message, reply_text, translations)
+            except Exception as e:
+                logger.error(f"[TelegramBot] 回复翻译结果失败: {e}")
+
+    async def _plan_translation(self, event, text):
+        """
+        按规则与检测到的语言计算翻译目标，返回 (prefer, all_targets, src2tgts)；无规则或无目标时返回 None
+        """
         group_id = str(event.chat_id)
         user_id = str(event.sender_id)
-        rule_raw = self.rule_manager.get_rule(group_id, user_id)
-        if not rule_raw:
-            return
+        if not self.rule_manager.is_tracked(group_id, user_id):
+            return None
         # 只有有规则时才输出日志
         logger.info(f"[TelegramBot] 收到新消息: {text[:20]}...")
         logger.info(f"[TelegramBot] 自动翻译流程启动，消息内容: {text[:20]}...")
-        rule_list = rule_raw if isinstance(rule_raw, list) else [rule_raw]
         prefer = self.config_manager.get("default_translate_source", "deeplx")
-        detected_lang = self.lang_detector.detect(text)
+        detected_lang = await self.lang_detector.detect_async(text)
         detected_langs = detected_lang if isinstance(detected_lang, list) else [detected_lang]
-        all_targets = set()
+        # 规则解析索引：(会话, 用户, 检测语言) -> 目标语言集合，常数时间查询
+        src2tgts = {}
         for dlang in detected_langs:
-            for rule in rule_list:
-                source_langs = rule.get('source_langs', ['en'])
-                target_langs = rule.get('target_langs', ['zh'])
-                if dlang in source_langs or (dlang == "zh" and "zh" in source_langs):
-                    for lang in target_langs:
-                        if lang != dlang:
-                            all_targets.add((dlang, lang))
-        if not all_targets:
+            targets = self.rule_manager.resolve(group_id, user_id, dlang)
+            if targets:
+                src2tgts[dlang] = set(targets)
+        if not src2tgts:
             logger.info("[TelegramBot] 未匹配到目标语言，跳过")
+            return None
+        all_targets = {(src, tgt) for src, tgts in src2tgts.items() for tgt in tgts}
+        return prefer, all_targets, src2tgts
+
+    async def _translate_groups(self, text, src2tgts, prefer):
+        """
+        按源语言分组并发翻译（并发上限由翻译服务的引擎调度控制），全部完成后按源语言、目标语言排序，
+        返回 [(源语言, 目标语言, 译文)]，保证回复顺序稳定
+        """
+        groups = [(src, sorted(tgts)) for src, tgts in sorted(src2tgts.items())]
+        results = await asyncio.gather(*[
+            self.translation_service.translate(text, src, tgts, prefer=prefer)
+            for src, tgts in groups
+        ])
+        translations = []
+        for (src, tgts), translated in zip(groups, results):
+            for lang in tgts:
+                translations.append((src, lang, translated.get(lang, "")))
+        return translations
+
+    async def _retranslate_edit(self, old_text, text, old_translations, src2tgts, prefer):
+        """
+        编辑消息的增量重译：旧译文与旧原文按行对齐后，每个源语言分组只把变化的行合并为一次请求翻译，
+        未变化的行沿用旧译文；无法对齐（行数不一致、无旧译文）或变化行的译文行数不符时，该分组整段重译。
+        返回 [(源语言, 目标语言, 译文)]
+        """
+        from .segment import line_translations, changed_lines, rebuild_lines
+        previous = {(src, lang): translated for src, lang, translated in old_translations}
+
+        async def _group(src, tgts):
+            mappings = {}
+            for lang in tgts:
+                old = previous.get((src, lang))
+                mapping = line_translations(old_text, old) if old and not old.startswith("[翻译失败]") else None
+                if mapping is None:
+                    break
+                mappings[lang] = mapping
+            if len(mappings) == len(tgts):
+                changed = changed_lines(mappings[tgts[0]], text)
+                logger.info(f"[TelegramBot] 消息已编辑，源语言 {src}: {len(changed)} 行有变化，仅重译变化的行")
+                if changed:
+                    results = await self.translation_service.translate("\n".join(changed), src, tgts, prefer=prefer)
+                    for lang in tgts:
+                        result = results.get(lang, "")
+                        lines = [line.strip() for line in result.splitlines() if line.strip()]
+                        if result.startswith("[翻译失败]") or len(lines) != len(changed):
+                            mappings = None
+                            break
+                        mappings[lang] = {**mappings[lang], **dict(zip(changed, lines))}
+                if mappings is not None:
+                    return {lang: rebuild_lines(text, mappings[lang]) for lang in tgts}
+            logger.info(f"[TelegramBot] 消息已编辑，源语言 {src} 的旧译文无法按行对齐，整段重译")
+            return await self.translation_service.translate(text, src, tgts, prefer=prefer)
+
+        groups = [(src, sorted(tgts)) for src, tgts in sorted(src2tgts.items())]
+        results = await asyncio.gather(*[_group(src, tgts) for src, tgts in groups])
+        return [
+            (src, lang, translated.get(lang, ""))
+            for (src, tgts), translated in zip(groups, results)
+            for lang in tgts
+        ]
+
+    def _edit_tracking_size(self):
+        edit_cfg = self.config_manager.get("edit_tracking", {}) or {}
+        if not edit_cfg.get("enabled", True):
+            return 0
+        return int(edit_cfg.get("max_messages", 500))
+
+    def _track_reply(self, event, text, message, reply_text, translations):
+        """
+        记录 原消息 -> (原文, 我方回复, 回复文本, [(源语言, 目标语言, 译文)]) 的映射，供编辑消息时按行增量重译并原地更新；
+        超出 max_messages 时淘汰最久未使用的记录
+        """
+        max_messages = self._edit_tracking_size()
+        if message is None or not reply_text or max_messages <= 0:
             return
-        src2tgts = {}
-        for src, tgt in all_targets:
-            src2tgts.setdefault(src, set()).add(tgt)
+        key = (event.chat_id, event.message.id)
+        self._tracked_replies[key] = (text, message, reply_text, translations)
+        self._tracked_replies.move_to_end(key)
+        while len(self._tracked_replies) > max_messages:
+            self._tracked_replies.popitem(last=False)
+
+    async def handle_edit(self, event):
+        """
+        编辑消息的增量重译：仅处理已回复过的消息，只翻译变化的行（见 _retranslate_edit），
+        并原地编辑原有回复而不是发送新回复
+        """
+        key = (event.chat_id, event.message.id)
+        tracked = self._tracked_replies.get(key)
+        if tracked is None:
+            return
+        self._tracked_replies.move_to_end(key)
+        old_text, message, old_reply, old_translations = tracked
+        text = getattr(event.message, "text", "")
+        if not text or text == old_text or text.strip().startswith(".fy-"):
+            return
+        from .utils import should_ignore
+        if should_ignore(text, self._get_ignore_matcher()):
+            return
+        plan = await self._plan_translation(event, text)
+        if plan is None:
+            return
+        prefer, _, src2tgts = plan
+        # 翻译期间再次编辑时，以最新一次为准，丢弃过期结果；
+        # 记录中的原文与译文保持为回复当前显示的内容，编辑失败或提前返回时不变
+        self._pending_edits[key] = text
+        try:
+            translations = await self._retranslate_edit(old_text, text, old_translations, src2tgts, prefer)
+            if self._pending_edits.get(key) != text:
+                logger.info("[TelegramBot] 翻译期间消息再次被编辑，丢弃过期译文")
+                return
+            reply_text = self._format_reply(text, [(lang, translated) for _, lang, translated in translations])
+            if not reply_text:
+                return
+            if reply_text == old_reply:
+                # 回复内容不变，仍与新原文一致
+                self._tracked_replies[key] = (text, message, reply_text, translations)
+                return
+            if await self.edit_reply(message, reply_text):
+                self._tracked_replies[key] = (text, message, reply_text, translations)
+                logger.info("[TelegramBot] 已原地更新编辑消息的译文")
+        finally:
+            if self._pending_edits.get(key) == text:
+                del self._pending_edits[key]
+
+    def _format_reply(self, text, translations, suffix=""):
+        """
+        将 [(语言, 译文)] 格式化为回复文本；跳过空译文和与原文一致的译文
+        """
         reply_text = ""
-        lang_map = {
-            "en": "英语", "zh": "中文", "fr": "法语", "de": "德语", "ru": "俄语", "ja": "日语", "ko": "韩语", "ar": "阿拉伯语",
-            "hi": "印地语", "tr": "土耳其语", "fa": "波斯语", "uk": "乌克兰语", "es": "西班牙语", "it": "意大利语", "rm": "罗曼什语",
-            "pt": "葡萄牙语", "pl": "波兰语", "nl": "荷兰语", "sv": "瑞典语", "ro": "罗马尼亚语", "cs": "捷克语", "el": "希腊语",
-            "da": "丹麦语", "fi": "芬兰语", "hu": "匈牙利语", "he": "希伯来语", "bg": "保加利亚语", "sr": "塞尔维亚语",
-            "hr": "克罗地亚语", "sk": "斯洛伐克语", "sl": "斯洛文尼亚语", "no": "挪威语"
-        }
-        import asyncio
-        for src, tgts in src2tgts.items():
-            translated = await self.translation_service.translate(text, src, list(tgts), prefer=prefer)
-            for lang in tgts:
-                reply = translated.get(lang, "")
-                if not reply or reply.strip() == text.strip():
-                    continue
-                lang_name = lang_map.get(lang, lang)
-                # 判断是否多行
-                if "\n" in reply:
-                    reply_text += f"{lang_name}：\n```\n{reply}\n```\n"
-                else:
-                    reply_text += f"{lang_name}：`{reply}`\n"
+        for lang, reply in translations:
+            if not reply or reply.strip() == text.strip():
+                continue
+            reply = reply + suffix
+            lang_name = LANG_NAMES.get(lang, lang)
+            # 判断是否多行
+            if "\n" in reply:
+                reply_text += f"{lang_name}：\n```\n{reply}\n```\n"
+            else:
+                reply_text += f"{lang_name}：`{reply}`\n"
         if reply_text:
             # 仅当唯一一条回复且内容本身为多行时，整体包裹代码块
             lines = [line for line in reply_text.strip().split("\n") if line]
@@ -153,11 +355,47 @@ class TelegramBot:
             ):
                 # 单条多行，整体用代码块
                 reply_text = f"```\n{reply_text.strip()}\n```"
-            try:
-                await self.send_reply(event, reply_text.strip())
-                logger.info("[TelegramBot] 回复翻译结果成功")
-            except Exception as e:
-                logger.error(f"[TelegramBot] 回复翻译结果失败: {e}")
+        return reply_text.strip()
+
+    async def _stream_reply(self, event, text, src, tgt, prefer, stream_cfg):
+        """
+        流式翻译回复：累计译文达到 stream_min_chars 后先发出回复，之后按 stream_edit_interval 秒的节奏编辑，
+        结束时编辑为完整译文；返回 (回复消息, 回复文本, [(源语言, 目标语言, 译文)])
+        """
+        interval = float(stream_cfg.get("stream_edit_interval", 1.5))
+        min_chars = int(stream_cfg.get("stream_min_chars", 20))
+        message = None
+        # 首次发送已尝试过：发送失败或被合并进其他回复（返回 None）后不再发送部分译文
+        attempted = False
+        sent_text = ""
+        last_edit = 0.0
+        final = ""
+        async for partial in self.translation_service.translate_stream(text, src, tgt, prefer=prefer):
+            final = partial
+            now = time.monotonic()
+            if message is None:
+                if attempted or len(partial.strip()) < min_chars:
+                    continue
+                sent_text = self._format_reply(text, [(tgt, partial)], suffix=" …")
+                if sent_text:
+                    attempted = True
+                    message = await self.send_reply(event, sent_text)
+                    last_edit = now
+            elif now - last_edit >= interval:
+                partial_text = self._format_reply(text, [(tgt, partial)], suffix=" …")
+                if partial_text and partial_text != sent_text and await self.edit_reply(message, partial_text):
+                    sent_text = partial_text
+                    last_edit = now
+        final_text = self._format_reply(text, [(tgt, final)])
+        if not final_text:
+            return message, sent_text, [(src, tgt, final)]
+        if message is None:
+            # 未发送过，或首次发送未得到消息：完整译文最多再发送一次
+            message = await self.send_reply(event, final_text)
+        elif final_text != sent_text:
+            await self.edit_reply(message, final_text)
+        logger.info("[TelegramBot] 流式回复翻译结果完成")
+        return message, final_text, [(src, tgt, final)]
 
     def run(self):
         """
@@ -165,10 +403,19 @@ class TelegramBot:
         """
         import asyncio
         loop = asyncio.get_event_loop()
+        start = time.monotonic()
         logger.info("[TelegramBot] 启动 Telegram 客户端")
+        # fasttext 模型在后台加载，加载完成前语言检测仅使用规则判定
+        self.lang_detector.start_background_load()
         # 启动配置热重载和健康检查任务（如有实现）
         # loop.create_task(self.config_manager.hot_reload_loop())
-        # loop.create_task(self.translation_service.health_check_loop())
+        loop.create_task(self.translation_service.health_check_loop())
+        loop.create_task(self.translation_service.cache_maintenance_loop())
         self.client.start()
-        logger.info("Telegram 客户端已启动，等待消息...")
-        self.client.run_until_disconnected()
+        logger.info(f"Telegram 客户端已启动，耗时 {time.monotonic() - start:.2f}s，等待消息...")
+        try:
+            self.client.run_until_disconnected()
+        finally:
+            loop.run_until_complete(self.outbound.close())
+            self.rule_manager.close()
+            loop.run_until_complete(self.translation_service.close())
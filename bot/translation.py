@@ -4,6 +4,7 @@ translation.py
 """
 
 import asyncio
+import contextlib
 from abc import ABC, abstractmethod
 
 class BaseTranslator(ABC):
@@ -12,6 +13,16 @@ class BaseTranslator(ABC):
     """
     def __init__(self, config):
         self.config = config
+        # 由 TranslationService 注入的全局调度器，用于端点级并发预算
+        self.scheduler = None
+
+    def _endpoint_slot(self, endpoint):
+        """
+        获取端点并发名额，未注入调度器时不做限制
+        """
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.endpoint_slot(endpoint)
 
     @abstractmethod
     async def translate(self, text, source_lang, target_lang):
@@ -26,80 +37,119 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# 全局异步ClientSession单例
-_aiohttp_session = None
+from .http_client import HttpClientManager
+
+# 全局共享 HTTP 客户端，由 TranslationService 按配置初始化
+_http_client = HttpClientManager()
+
+def configure_http_client(cfg):
+    """
+    按配置重建全局 HTTP 客户端管理器（需在首次请求前调用）
+    """
+    global _http_client
+    _http_client = HttpClientManager.from_config(cfg)
+    return _http_client
+
 async def get_aiohttp_session():
-    global _aiohttp_session
-    if _aiohttp_session is None or _aiohttp_session.closed:
-        _aiohttp_session = aiohttp.ClientSession()
-    return _aiohttp_session
+    return await _http_client.get_session()
+
+async def close_aiohttp_session():
+    await _http_client.close()
 
 class DeeplxTranslator(BaseTranslator):
     """
     Deeplx 翻译引擎实现
+    每个接口一个熔断器，连续失败达到阈值后熔断，由后台探测或半开探测自动恢复
     """
     def __init__(self, config):
         super().__init__(config)
         self.base_urls = config.get("base_urls", [])
-        self.fail_count = [0] * len(self.base_urls)
-        self.disabled = set()
         self.fail_threshold = int(config.get("deeplx_fail_threshold", 3)) if config else 3
+        recovery_timeout = float(config.get("recovery_timeout", 60)) if config else 60
+        from .circuit import CircuitBreaker
+        self.breakers = [
+            CircuitBreaker(f"deeplx-{idx+1}", self.fail_threshold, recovery_timeout)
+            for idx in range(len(self.base_urls))
+        ]
         self.current_idx = 0
 
+    @property
+    def disabled(self):
+        return {idx for idx, breaker in enumerate(self.breakers) if breaker.is_open}
+
+    async def _post(self, idx, payload, timeout=10):
+        """
+        向第 idx 个接口发送一次请求（含网络异常重试），成功返回译文，否则返回 None 或抛出异常
+        """
+        base_url = self.base_urls[idx]
+        session = await get_aiohttp_session()
+        # 自动重试机制
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                async with self._endpoint_slot(f"deeplx-{idx+1}"), session.post(base_url, json=payload, timeout=timeout) as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        if data.get('code') == 200 and data.get('data'):
+                            return data['data']
+                        logger.warning(f"Deeplx接口 {base_url} 返回异常: {data}")
+                    else:
+                        logger.warning(f"Deeplx接口 {base_url} 失败，状态码: {resp.status}")
+                return None  # 非网络异常不重试
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Deeplx接口 {base_url} 网络异常尝试第{attempt+1}次: {e}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(0.5 * (2 ** attempt))
+                else:
+                    raise
+
     async def translate(self, text, source_lang, target_lang):
         n = len(self.base_urls)
         if n == 0:
             raise Exception("deeplx base_urls 未配置")
-        tried = 0
-        while tried < n:
+        payload = {
+            "text": text,
+            "source_lang": source_lang,
+            "target_lang": target_lang
+        }
+        for _ in range(n):
             idx = self.current_idx % n
             self.current_idx = (self.current_idx + 1) % n
-            if idx in self.disabled:
-                tried += 1
+            breaker = self.breakers[idx]
+            if not breaker.allow_request():
                 continue
-            base_url = self.base_urls[idx]
+            result = None
             try:
-                payload = {
-                    "text": text,
-                    "source_lang": source_lang,
-                    "target_lang": target_lang
-                }
-                session = await get_aiohttp_session()
-                # 自动重试机制
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        async with session.post(base_url, json=payload, timeout=10) as resp:
-                            if resp.status == 200:
-                                data = await resp.json()
-                                if data.get('code') == 200 and data.get('data'):
-                                    self.fail_count[idx] = 0
-                                    return data['data']
-                                else:
-                                    self.fail_count[idx] += 1
-                                    logger.warning(f"Deeplx接口 {base_url} 返回异常: {data}")
-                            else:
-                                self.fail_count[idx] += 1
-                                logger.warning(f"Deeplx接口 {base_url} 失败，状态码: {resp.status}")
-                        break  # 非网络异常不重试
-                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                        logger.warning(f"Deeplx接口 {base_url} 网络异常尝试第{attempt+1}次: {e}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(0.5 * (2 ** attempt))
-                        else:
-                            raise
+                result = await self._post(idx, payload)
             except Exception as e:
-                self.fail_count[idx] += 1
-                logger.error(f"Deeplx接口 {base_url} 网络请求异常: {e}", exc_info=True)
-            if self.fail_count[idx] >= self.fail_threshold:
-                self.disabled.add(idx)
-                logger.error(f"已禁用第{idx+1}个deeplx接口: {base_url}，连续失败{self.fail_threshold}次，请及时检查或更新！")
-            tried += 1
-        raise Exception("所有Deeplx接口均已禁用或不可用")
+                logger.error(f"Deeplx接口 {self.base_urls[idx]} 网络请求异常: {e}", exc_info=True)
+            if result:
+                breaker.record_success()
+                return result
+            breaker.record_failure()
+        raise Exception("所有Deeplx接口均已熔断或不可用")
 
     async def health_check(self):
-        # TODO: 实现 Deeplx 健康检查
-        raise NotImplementedError
+        """
+        探测所有已熔断的接口，成功即恢复
+        """
+        payload = {"text": "hello", "source_lang": "en", "target_lang": "zh"}
+        for idx, breaker in enumerate(self.breakers):
+            if not breaker.is_open:
+                continue
+            try:
+                result = await self._post(idx, payload, timeout=15)
+            except Exception as e:
+                logger.warning(f"[HEALTH] Deeplx接口 deeplx-{idx+1} 探测失败: {e}")
+                result = None
+            if result:
+                breaker.record_success()
+                logger.info(f"[HEALTH] Deeplx接口已恢复: deeplx-{idx+1}")
+            else:
+                breaker.record_failure()
+
+    def breaker_stats(self):
+        return {breaker.name: breaker.describe() for breaker in self.breakers}
 
 import time
 
@@ -127,140 +177,288 @@ class OpenAITranslator(BaseTranslator):
             endpoints = group.get('endpoints', [])
             if not isinstance(endpoints, list) or not endpoints:
                 continue
-            for endpoint in endpoints:
+            for ep_idx, endpoint in enumerate(endpoints):
                 if not isinstance(endpoint, dict):
                     continue
                 url = endpoint.get('url')
                 key = endpoint.get('api_key')
                 if not url or not key:
                     continue
+                group_name = group.get('name', 'UnnamedGroup')
                 self.flat_endpoints.append({
                     'url': url,
                     'api_key': key,
                     'models': models,
-                    'group_name': group.get('name', 'UnnamedGroup')
+                    'group_name': group_name,
+                    # 端点标签：组名-序号，用于日志、调度与统计（不暴露url和apikey）
+                    'label': f"{group_name}-{ep_idx+1}"
                 })
-        self.fail_count = [0] * len(self.flat_endpoints)
-        self.disabled = set()
+        # 所有 (端点, 模型) 候选，按配置顺序排列，由延迟感知的负载均衡器排序选择
+        self.candidates = [
+            (endpoint_info, model)
+            for endpoint_info in self.flat_endpoints
+            for model in endpoint_info['models']
+        ]
+        from .balancer import EndpointBalancer
+        self.balancer = EndpointBalancer.from_config(config.get('balancer', {}) if config else {})
         self.fail_threshold = int(config.get('openai_fail_threshold', 3)) if config else 3
-        self.current_idx = 0
+        recovery_timeout = float(config.get('recovery_timeout', 60)) if config else 60
+        # 每个端点一个熔断器，按端点标签索引
+        from .circuit import CircuitBreaker
+        self.breakers = {
+            endpoint_info['label']: CircuitBreaker(f"openai:{endpoint_info['label']}", self.fail_threshold, recovery_timeout)
+            for endpoint_info in self.flat_endpoints
+        }
+
+    @property
+    def disabled(self):
+        return {
+            idx for idx, endpoint_info in enumerate(self.flat_endpoints)
+            if self.breakers[endpoint_info['label']].is_open
+        }
 
     async def translate(self, text, source_lang, target_lang):
-        import random
-        if not self.model_groups:
+        messages = [
+            {"role": "system", "content": "You are a translation engine, only returning translated answers."},
+            {"role": "user", "content": f"Translate the text to {target_lang} please do not explain my original text, do not explain the translation results, Do not explain the context.:\n{text}"}
+        ]
+        return await self._chat_completion(messages)
+
+    async def translate_stream(self, text, source_lang, target_lang):
+        """
+        流式翻译：逐步产出目前为止的累计译文
+        端点在产出任何内容前失败时切换下一个候选；产出内容后失败则抛出异常
+        """
+        messages = [
+            {"role": "system", "content": "You are a translation engine, only returning translated answers."},
+            {"role": "user", "content": f"Translate the text to {target_lang} please do not explain my original text, do not explain the translation results, Do not explain the context.:\n{text}"}
+        ]
+        if not self.candidates:
             raise Exception("openai.model_groups 未配置或配置无效")
-        group = random.choice(self.model_groups)
-        endpoints = group.get('endpoints', [])
-        if not endpoints:
-            raise Exception("选中的openai.model_group无可用端点")
-        models = group.get('models', ['gpt-4o'])
-        n = len(endpoints)
-        if n == 0 or not models:
-            raise Exception("选中的openai.model_group无可用端点或模型")
-        group_name = group.get('name', 'UnnamedGroup')
-        for idx in range(n):
-            endpoint = endpoints[(self.current_idx + idx) % n]
-            url = endpoint.get('url')
-            key = endpoint.get('api_key')
-            if not url or not key:
+        for endpoint_info, model_to_use in self.balancer.order(self.candidates, key=lambda c: f"{c[0]['label']}/{c[1]}"):
+            label = endpoint_info['label']
+            breaker = self.breakers[label]
+            if not breaker.allow_request():
                 continue
-            for model_to_use in models:
-                # 日志输出：OpenAI-组名-端点序号-模型名称（不显示url和apikey）
-                logger.info(f"OpenAI-{group_name}-{idx+1}-{model_to_use}")
+            logger.info(f"OpenAI-stream-{label}-{model_to_use}")
+            start = time.monotonic()
+            content = None
+            interrupted = False
+            try:
+                async for content in self._stream_completion(endpoint_info, model_to_use, messages):
+                    yield content
+                if content:
+                    return
+            except (asyncio.CancelledError, GeneratorExit):
+                interrupted = True
+                raise
+            except Exception as e:
+                logger.error(f"OpenAI流式接口 {endpoint_info['url']} (模型: {model_to_use}) 调用失败: {e}")
+                if content:
+                    raise
+            finally:
+                if not interrupted:
+                    self.balancer.record(f"{label}/{model_to_use}", time.monotonic() - start, bool(content))
+                    if content:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+        raise Exception("所有OpenAI接口均已熔断或不可用")
+
+    async def _stream_completion(self, endpoint_info, model_to_use, messages):
+        """
+        以 stream 模式请求 /v1/chat/completions，解析 SSE 数据行，逐步产出累计内容
+        """
+        import json
+        url = endpoint_info['url']
+        api_url = url.rstrip("/")
+        if api_url.endswith("/v1"):
+            api_url = api_url[:-3]
+        api_url = api_url + "/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {endpoint_info['api_key']}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model_to_use,
+            "messages": messages,
+            "stream": True
+        }
+        session = await get_aiohttp_session()
+        timeout = aiohttp.ClientTimeout(total=120, sock_read=30)
+        content = ""
+        async with self._endpoint_slot(endpoint_info['label']), session.post(api_url, headers=headers, json=payload, timeout=timeout) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"状态码: {resp.status}, 响应: {error_text}")
+            async for raw_line in resp.content:
+                line = raw_line.decode("utf-8", "ignore").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
                 try:
-                    api_url = url.rstrip("/")
-                    if api_url.endswith("/v1"):
-                        api_url = api_url[:-3]
-                    api_url = api_url + "/v1/chat/completions"
-                    headers = {
-                        "Authorization": f"Bearer {key}",
-                        "Content-Type": "application/json"
-                    }
-                    payload = {
-                        "model": model_to_use,
-                        "messages": [
-                            {"role": "system", "content": "You are a translation engine, only returning translated answers."},
-                            {"role": "user", "content": f"Translate the text to {target_lang} please do not explain my original text, do not explain the translation results, Do not explain the context.:\n{text}"}
-                        ]
-                    }
-                    session = await get_aiohttp_session()
-                    max_retries = 3
-                    for attempt in range(max_retries):
-                        try:
-                            async with session.post(api_url, headers=headers, json=payload, timeout=30) as resp:
-                                if resp.status == 200:
-                                    data = await resp.json()
-                                    content = data.get("choices", [{}])[0].get("message", {}).get("content")
-                                    # 针对Gemini模型，去除多余markdown包装
-                                    if content and "gemini" in model_to_use.lower():
-                                        import re
-                                        # 去除```markdown ... ```包裹
-                                        content = re.sub(r"^```markdown\s*([\s\S]*?)\s*```$", r"\1", content.strip(), flags=re.IGNORECASE)
-                                    if content:
-                                        self.current_idx = (self.current_idx + idx + 1) % n
-                                        return content
-                                    else:
-                                        logger.warning(f"OpenAI接口 {api_url} 返回了非预期的JSON格式或空内容: {data}")
-                                else:
-                                    error_text = await resp.text()
-                                    logger.warning(f"OpenAI接口 {api_url} 状态码: {resp.status}, 响应: {error_text}")
-                            break  # 非网络异常不重试
-                        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                            logger.warning(f"OpenAI接口 {api_url} 网络异常尝试第{attempt+1}次: {e}")
-                            if attempt < max_retries - 1:
-                                await asyncio.sleep(0.5 * (2 ** attempt))
-                            else:
-                                raise
-                except Exception as e:
-                    logger.error(f"OpenAI接口 {url} (模型: {model_to_use}) 调用失败: {e}")
-        raise Exception("所有OpenAI接口均已禁用或不可用")
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                delta = ((chunk.get("choices") or [{}])[0].get("delta") or {}).get("content")
+                if delta:
+                    content += delta
+                    yield content
+        # 针对Gemini模型，去除多余markdown包装
+        if content and "gemini" in model_to_use.lower():
+            import re
+            cleaned = re.sub(r"^```markdown\s*([\s\S]*?)\s*```$", r"\1", content.strip(), flags=re.IGNORECASE)
+            if cleaned != content:
+                yield cleaned
+
+    async def translate_batch(self, text, source_lang, target_langs):
+        """
+        一次请求翻译到多个目标语言，要求模型返回 JSON 对象 {语言代码: 译文}
+        解析失败或缺少任一语言时抛出异常，由调用方回退为逐语言翻译
+        """
+        langs = list(target_langs)
+        lang_list = ", ".join(langs)
+        messages = [
+            {"role": "system", "content": "You are a translation engine, only returning translated answers."},
+            {"role": "user", "content": (
+                f"Translate the text into each of these languages: {lang_list}. "
+                f"Return only a JSON object whose keys are exactly these language codes ({lang_list}) "
+                "and whose values are the translations as strings. "
+                "Do not explain my original text, do not explain the translation results, do not add any other text.:\n"
+                f"{text}"
+            )}
+        ]
+        content = await self._chat_completion(messages)
+        return self._parse_batch_result(content, langs)
+
+    @staticmethod
+    def _parse_batch_result(content, langs):
+        import re
+        import json
+        raw = content.strip()
+        # 去除```json ... ```包裹
+        raw = re.sub(r"^```(?:json)?\s*([\s\S]*?)\s*```$", r"\1", raw, flags=re.IGNORECASE)
+        start, end = raw.find("{"), raw.rfind("}")
+        if start < 0 or end <= start:
+            raise ValueError(f"批量翻译结果不是JSON对象: {content[:100]}")
+        data = json.loads(raw[start:end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("批量翻译结果不是JSON对象")
+        results = {}
+        for lang in langs:
+            value = data.get(lang)
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"批量翻译结果缺少语言: {lang}")
+            results[lang] = value
+        return results
+
+    async def _request_completion(self, endpoint_info, model_to_use, messages, timeout=30):
+        """
+        向单个端点的指定模型请求 /v1/chat/completions（含网络异常重试），返回回复内容，失败返回 None 或抛出异常
+        """
+        url = endpoint_info['url']
+        key = endpoint_info['api_key']
+        api_url = url.rstrip("/")
+        if api_url.endswith("/v1"):
+            api_url = api_url[:-3]
+        api_url = api_url + "/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model_to_use,
+            "messages": messages
+        }
+        session = await get_aiohttp_session()
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                async with self._endpoint_slot(endpoint_info['label']), session.post(api_url, headers=headers, json=payload, timeout=timeout) as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        content = data.get("choices", [{}])[0].get("message", {}).get("content")
+                        # 针对Gemini模型，去除多余markdown包装
+                        if content and "gemini" in model_to_use.lower():
+                            import re
+                            # 去除```markdown ... ```包裹
+                            content = re.sub(r"^```markdown\s*([\s\S]*?)\s*```$", r"\1", content.strip(), flags=re.IGNORECASE)
+                        if content:
+                            return content
+                        logger.warning(f"OpenAI接口 {api_url} 返回了非预期的JSON格式或空内容: {data}")
+                    else:
+                        error_text = await resp.text()
+                        logger.warning(f"OpenAI接口 {api_url} 状态码: {resp.status}, 响应: {error_text}")
+                return None  # 非网络异常不重试
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"OpenAI接口 {api_url} 网络异常尝试第{attempt+1}次: {e}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(0.5 * (2 ** attempt))
+                else:
+                    raise
+
+    async def _chat_completion(self, messages):
+        """
+        按负载均衡器给出的顺序依次尝试 (端点, 模型)，跳过已熔断端点，返回首个有效回复内容
+        """
+        if not self.candidates:
+            raise Exception("openai.model_groups 未配置或配置无效")
+        for endpoint_info, model_to_use in self.balancer.order(self.candidates, key=lambda c: f"{c[0]['label']}/{c[1]}"):
+            label = endpoint_info['label']
+            breaker = self.breakers[label]
+            if not breaker.allow_request():
+                continue
+            # 日志输出：OpenAI-组名-端点序号-模型名称（不显示url和apikey）
+            logger.info(f"OpenAI-{label}-{model_to_use}")
+            start = time.monotonic()
+            content = None
+            cancelled = False
+            try:
+                content = await self._request_completion(endpoint_info, model_to_use, messages)
+                if content:
+                    return content
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            except Exception as e:
+                logger.error(f"OpenAI接口 {endpoint_info['url']} (模型: {model_to_use}) 调用失败: {e}")
+            finally:
+                # 被取消（如对冲请求胜出）的尝试只说明端点较慢，不计入负载均衡与熔断统计
+                if not cancelled:
+                    self.balancer.record(f"{label}/{model_to_use}", time.monotonic() - start, bool(content))
+                    if content:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+        raise Exception("所有OpenAI接口均已熔断或不可用")
 
     async def health_check(self):
-        # 轮询所有禁用端点，尝试恢复
-        for idx in list(self.disabled):
-            if idx >= len(self.flat_endpoints):
+        """
+        探测所有已熔断的端点（使用该端点的第一个模型），成功即恢复
+        """
+        messages = [
+            {"role": "system", "content": "You are a translation engine, only returning translated answers."},
+            {"role": "user", "content": "Translate the text to en: hello"}
+        ]
+        for endpoint_info in self.flat_endpoints:
+            breaker = self.breakers[endpoint_info['label']]
+            if not breaker.is_open:
                 continue
-            endpoint_info = self.flat_endpoints[idx]
-            url = endpoint_info.get('url')
-            key = endpoint_info.get('api_key')
-            model_to_check = endpoint_info['models'][0]
             try:
-                api_url = url.rstrip("/")
-                if api_url.endswith("/v1"):
-                    api_url = api_url[:-3]
-                api_url = api_url + "/v1/chat/completions"
-                headers = {
-                    "Authorization": f"Bearer {key}",
-                    "Content-Type": "application/json"
-                }
-                payload = {
-                    "model": model_to_check,
-                    "messages": [
-                        {"role": "system", "content": "You are a translation engine, only returning translated answers."},
-                        {"role": "user", "content": f"Translate the text to en: hello"}
-                    ]
-                }
-                session = await get_aiohttp_session()
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        async with session.post(api_url, headers=headers, json=payload, timeout=15) as resp:
-                            if resp.status == 200:
-                                data = await resp.json()
-                                content = data.get("choices", [{}])[0].get("message", {}).get("content")
-                                if content:
-                                    self.disabled.remove(idx)
-                                    self.fail_count[idx] = 0
-                                    logger.info(f"[HEALTH] OpenAI端点已恢复: 第{idx+1}个 {url} (组: {endpoint_info['group_name']})")
-                        break
-                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                        logger.warning(f"OpenAI健康检查 {api_url} 网络异常尝试第{attempt+1}次: {e}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(0.5 * (2 ** attempt))
-                        else:
-                            pass
-            except Exception:
-                pass
+                content = await self._request_completion(endpoint_info, endpoint_info['models'][0], messages, timeout=15)
+            except Exception as e:
+                logger.warning(f"[HEALTH] OpenAI端点 {endpoint_info['label']} 探测失败: {e}")
+                content = None
+            if content:
+                breaker.record_success()
+                logger.info(f"[HEALTH] OpenAI端点已恢复: {endpoint_info['label']} (组: {endpoint_info['group_name']})")
+            else:
+                breaker.record_failure()
+
+    def breaker_stats(self):
+        return {breaker.name: breaker.describe() for breaker in self.breakers.values()}
 
 class TranslationService:
     """
@@ -269,69 +467,312 @@ class TranslationService:
     def __init__(self, config_manager):
         self.config_manager = config_manager
         logger.info("[TranslationService] 初始化各翻译引擎")
+        self.http_client = configure_http_client(config_manager.get("http", {}))
+        # 熔断阈值与恢复时间位于配置顶层，合并进各引擎配置
+        health_cfg = config_manager.get("health_check", {}) or {}
+        recovery_timeout = health_cfg.get("recovery_timeout", 60)
+        deeplx_cfg = dict(config_manager.get("deeplx", {}) or {})
+        deeplx_cfg.setdefault("deeplx_fail_threshold", config_manager.get("deeplx_fail_threshold", 3) or 3)
+        deeplx_cfg.setdefault("recovery_timeout", recovery_timeout)
+        openai_cfg = dict(config_manager.get("openai", {}) or {})
+        openai_cfg.setdefault("openai_fail_threshold", config_manager.get("openai_fail_threshold", 3) or 3)
+        openai_cfg.setdefault("recovery_timeout", recovery_timeout)
         self.engines = {
-            "deeplx": DeeplxTranslator(config_manager.get("deeplx", {})),
-            "openai": OpenAITranslator(config_manager.get("openai", {})),
+            "deeplx": DeeplxTranslator(deeplx_cfg),
+            "openai": OpenAITranslator(openai_cfg),
         }
+        self._health_check_interval = float(health_cfg.get("interval", 30))
         self.default_engine = config_manager.get("default_translate_source", "deeplx")
-        # 简单内存LRU缓存
-        self._cache = {}
-        self._cache_order = []
-        self._cache_maxsize = 1000
-
-    def _cache_get(self, key):
-        if key in self._cache:
-            # LRU: 移到队尾
-            self._cache_order.remove(key)
-            self._cache_order.append(key)
-            return self._cache[key]
-        return None
-
-    def _cache_set(self, key, value):
-        if key in self._cache:
-            self._cache_order.remove(key)
-        elif len(self._cache_order) >= self._cache_maxsize:
-            oldest = self._cache_order.pop(0)
-            self._cache.pop(oldest, None)
-        self._cache[key] = value
-        self._cache_order.append(key)
+        # 服务级并发调度：引擎并发上限 + 端点连接预算 + 有界等待队列
+        from .scheduler import RequestScheduler
+        self.scheduler = RequestScheduler.from_config(config_manager.get("concurrency", {}))
+        # 对冲请求策略（默认关闭）
+        from .hedging import HedgePolicy
+        self.hedge_policy = HedgePolicy.from_config(config_manager.get("hedging", {}))
+        for engine in self.engines.values():
+            engine.scheduler = self.scheduler
+        # 内存LRU缓存，容量按条目数与字节数双重限制
+        from .cache import TranslationCache, PersistentTranslationCache
+        cache_cfg = config_manager.get("translation_cache", {}) or {}
+        self.cache = TranslationCache.from_config(cache_cfg)
+        # 持久化二级缓存（SQLite），启动时将热点条目预热到内存
+        self.persistent_cache = None
+        persist_cfg = cache_cfg.get("persistent", {}) or {}
+        if persist_cfg.get("enabled", False):
+            try:
+                self.persistent_cache = PersistentTranslationCache.from_config(persist_cfg)
+                warm_items = self.persistent_cache.warm(int(persist_cfg.get("warm_entries", 500)))
+                for key, value in warm_items:
+                    self.cache.set(key, value)
+                logger.info(f"[TranslationService] 持久化缓存预热 {len(warm_items)} 条")
+            except Exception as e:
+                self.persistent_cache = None
+                logger.error(f"[TranslationService] 持久化缓存初始化失败，仅使用内存缓存: {e}")
+        self._compact_interval = float(persist_cfg.get("compact_interval", 3600))
+        # 未完成的持久化写入，关闭前等待其全部完成
+        self._pending_writes = set()
+        # 进行中的上游请求：cache_key -> Future，用于合并并发的相同请求
+        self._inflight = {}
+        self._upstream_calls = 0
+        self._coalesced = 0
+        self._batch_calls = 0
+        self._batch_fallbacks = 0
+        self._segmented = 0
+        self._segments_total = 0
+        self._segment_failures = 0
 
-    async def translate(self, text, source_lang, target_langs, prefer=None):
+    def get_stats(self):
         """
-        并发翻译，主备切换，带缓存
+        汇总翻译服务运行统计，供 .fy-stats 展示
         """
-        logger.info(f"[TranslationService] 翻译请求: text={text[:20]}..., source_lang={source_lang}, target_langs={target_langs}, prefer={prefer}")
-        if prefer is None:
-            prefer = self.default_engine
-        backup_engine = "deeplx" if prefer == "openai" else "openai"
-        final_results = {}
-        semaphore = asyncio.Semaphore(5)
+        stats = {"cache": self.cache.stats()}
+        stats["upstream"] = {
+            "calls": self._upstream_calls,
+            "coalesced": self._coalesced,
+            "inflight": len(self._inflight),
+            "batch_calls": self._batch_calls,
+            "batch_fallbacks": self._batch_fallbacks,
+            "segmented_messages": self._segmented,
+            "segments": self._segments_total,
+            "segment_failures": self._segment_failures,
+        }
+        stats["http"] = self.http_client.stats()
+        stats["openai_balancer"] = self.engines["openai"].balancer.stats()
+        stats["hedging"] = self.hedge_policy.stats()
+        breakers = {}
+        for engine in self.engines.values():
+            if hasattr(engine, "breaker_stats"):
+                breakers.update(engine.breaker_stats())
+        stats["circuit"] = breakers
+        stats.update(self.scheduler.stats())
+        if self.persistent_cache is not None:
+            stats["persistent_cache"] = self.persistent_cache.stats()
+        return stats
 
-        async def translate_one(lang, engine):
-            cache_key = (text, source_lang, lang, engine)
-            cached = self._cache_get(cache_key)
-            if cached is not None:
-                logger.info(f"[TranslationService] 缓存命中: {cache_key}")
-                return lang, cached
-            await semaphore.acquire()
+    async def _cache_lookup(self, key):
+        """
+        依次查询内存缓存与持久化缓存，持久化命中时回填内存
+        """
+        cached = self.cache.get(key)
+        if cached is not None or self.persistent_cache is None:
+            return cached
+        try:
+            cached = await asyncio.to_thread(self.persistent_cache.get, key)
+        except Exception as e:
+            logger.warning(f"[TranslationService] 持久化缓存读取失败: {e}")
+            return None
+        if cached is not None:
+            self.cache.set(key, cached)
+        return cached
+
+    def _cache_store(self, key, value):
+        """
+        写入内存缓存，持久化缓存在线程池中异步写入，不阻塞回复
+        """
+        self.cache.set(key, value)
+        if self.persistent_cache is None:
+            return
+        def _write():
             try:
-                logger.info(f"[TranslationService] 调用引擎: {engine}, 目标语言: {lang}")
-                result = await self.engines[engine].translate(text, source_lang, lang)
+                self.persistent_cache.set(key, value)
+            except Exception as e:
+                logger.warning(f"[TranslationService] 持久化缓存写入失败: {e}")
+        future = asyncio.get_running_loop().run_in_executor(None, _write)
+        self._pending_writes.add(future)
+        future.add_done_callback(self._pending_writes.discard)
+
+    async def cache_maintenance_loop(self):
+        """
+        后台定期压缩持久化缓存
+        """
+        if self.persistent_cache is None:
+            return
+        while True:
+            await asyncio.sleep(self._compact_interval)
+            try:
+                await asyncio.to_thread(self.persistent_cache.compact)
+            except Exception as e:
+                logger.error(f"[TranslationService] 持久化缓存压缩失败: {e}")
+
+    async def close(self):
+        """
+        释放翻译服务持有的资源
+        """
+        await close_aiohttp_session()
+        if self.persistent_cache is not None:
+            if self._pending_writes:
+                await asyncio.gather(*self._pending_writes, return_exceptions=True)
+            await asyncio.to_thread(self.persistent_cache.close)
+
+    async def _translate_one(self, text, source_lang, lang, engine):
+        """
+        单语言翻译：缓存 -> 合并进行中的相同请求 -> 调用引擎
+        """
+        cache_key = (text, source_lang, lang, engine)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            logger.info(f"[TranslationService] 缓存命中: {cache_key}")
+            return lang, cached
+        # 单飞：相同请求正在进行时，等待同一个上游调用的结果
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            self._coalesced += 1
+            logger.info(f"[TranslationService] 合并进行中的相同请求: engine={engine}, lang={lang}")
+            return lang, await asyncio.shield(inflight)
+        inflight = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = inflight
+        result = None
+        try:
+            try:
+                result, answered_by = await self._call_engine(text, source_lang, lang, engine)
                 # 若翻译结果与原文一致，视为失败
                 if result is not None and result.strip() == text.strip():
                     logger.warning(f"[TranslationService] 翻译结果与原文一致，视为未翻译，lang={lang}")
-                    return lang, None
-                self._cache_set(cache_key, result)
-                return lang, result
+                    result = None
+                elif result is not None:
+                    # 按实际返回结果的引擎写入缓存，对冲请求胜出时不占用主引擎的缓存条目
+                    self._cache_store((text, source_lang, lang, answered_by), result)
             except Exception as e:
                 logger.error(f"[TranslationService] 翻译失败: engine={engine}, lang={lang}, error={e}")
-                return lang, None
-            finally:
-                semaphore.release()
+                result = None
+        finally:
+            self._inflight.pop(cache_key, None)
+            inflight.set_result(result)
+        return lang, result
+
+    async def _engine_translate(self, text, source_lang, lang, engine):
+        """
+        占用引擎并发名额调用一次引擎，成功时记录耗时供对冲策略计算延迟分位数
+        """
+        async with self.scheduler.engine_slot(engine):
+            self._upstream_calls += 1
+            logger.info(f"[TranslationService] 调用引擎: {engine}, 目标语言: {lang}")
+            start = time.monotonic()
+            result = await self.engines[engine].translate(text, source_lang, lang)
+        self.hedge_policy.record_latency(engine, time.monotonic() - start)
+        return result
+
+    async def _call_engine(self, text, source_lang, lang, engine):
+        """
+        调用引擎；开启对冲时，主请求超过延迟分位数仍未返回则向备用引擎发出相同请求，
+        取先成功返回者并取消另一个，对冲次数受预算限制。返回 (译文, 实际返回译文的引擎)
+        """
+        policy = self.hedge_policy
+        hedge_engine = "deeplx" if engine == "openai" else "openai"
+        if not policy.enabled or hedge_engine not in self.engines:
+            return await self._engine_translate(text, source_lang, lang, engine), engine
+        policy.on_request()
+        primary = asyncio.create_task(self._engine_translate(text, source_lang, lang, engine))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=policy.delay(engine))
+            if done or not policy.try_acquire():
+                return await primary, engine
+            logger.info(f"[TranslationService] 主请求超过对冲延迟，发出对冲请求: {engine} -> {hedge_engine}, lang={lang}")
+            hedge = asyncio.create_task(self._engine_translate(text, source_lang, lang, hedge_engine))
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    result = task.result()
+                    if result is not None and result.strip() != text.strip():
+                        if task is hedge:
+                            policy.hedge_wins += 1
+                            return result, hedge_engine
+                        return result, engine
+            if error is not None:
+                raise error
+            return None, engine
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _batch_enabled(self, engine):
+        if not hasattr(self.engines.get(engine), "translate_batch"):
+            return False
+        engine_cfg = self.config_manager.get(engine, {}) or {}
+        return bool(engine_cfg.get("batch_targets", True))
+
+    async def _translate_batch(self, text, source_lang, target_langs, engine):
+        """
+        多目标语言合并为一次引擎请求；结构化结果解析失败的语言回退为逐语言翻译
+        仅处理未命中缓存且无进行中请求的语言，返回 {lang: 译文或None}
+        """
+        results = {}
+        pending = []
+        for lang in target_langs:
+            cache_key = (text, source_lang, lang, engine)
+            cached = await self._cache_lookup(cache_key)
+            if cached is not None:
+                results[lang] = cached
+            elif cache_key not in self._inflight:
+                pending.append(lang)
+        if len(pending) < 2:
+            # 不足两种语言无需合并，交给逐语言流程
+            return results
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for lang in pending:
+            futures[lang] = loop.create_future()
+            self._inflight[(text, source_lang, lang, engine)] = futures[lang]
+        batch_results = {}
+        try:
+            try:
+                async with self.scheduler.engine_slot(engine):
+                    self._upstream_calls += 1
+                    self._batch_calls += 1
+                    logger.info(f"[TranslationService] 批量调用引擎: {engine}, 目标语言: {pending}")
+                    batch_results = await self.engines[engine].translate_batch(text, source_lang, pending)
+            except Exception as e:
+                self._batch_fallbacks += 1
+                logger.warning(f"[TranslationService] 批量翻译失败，回退逐语言翻译: engine={engine}, error={e}")
+            failed = []
+            for lang in pending:
+                result = batch_results.get(lang)
+                if result is not None and result.strip() != text.strip():
+                    results[lang] = result
+                    self._cache_store((text, source_lang, lang, engine), result)
+                else:
+                    failed.append(lang)
+            if failed:
+                # 先撤下批量占位，再逐语言翻译，等待中的相同请求最终拿到回退结果
+                for lang in failed:
+                    self._inflight.pop((text, source_lang, lang, engine), None)
+                fallback = await asyncio.gather(*[
+                    self._translate_one(text, source_lang, lang, engine) for lang in failed
+                ])
+                for lang, result in fallback:
+                    results[lang] = result
+        finally:
+            for lang, fut in futures.items():
+                cache_key = (text, source_lang, lang, engine)
+                if self._inflight.get(cache_key) is fut:
+                    del self._inflight[cache_key]
+                if not fut.done():
+                    fut.set_result(results.get(lang))
+        return results
 
-        # 1. 使用主引擎进行初次翻译
-        primary_tasks = [translate_one(lang, prefer) for lang in target_langs]
-        primary_results = await asyncio.gather(*primary_tasks)
+    async def _translate_text(self, text, source_lang, target_langs, prefer, backup_engine):
+        """
+        整段翻译：主引擎（支持时多目标语言合并为一次请求），失败语言切换备用引擎
+        返回 {lang: 译文或None}
+        """
+        final_results = {}
+
+        # 1. 使用主引擎进行初次翻译，支持时多目标语言合并为一次请求
+        primary_results = []
+        remaining_langs = list(target_langs)
+        if len(remaining_langs) > 1 and self._batch_enabled(prefer):
+            batch_results = await self._translate_batch(text, source_lang, remaining_langs, prefer)
+            primary_results.extend(batch_results.items())
+            remaining_langs = [lang for lang in remaining_langs if lang not in batch_results]
+        primary_tasks = [self._translate_one(text, source_lang, lang, prefer) for lang in remaining_langs]
+        primary_results.extend(await asyncio.gather(*primary_tasks))
 
         failed_langs = []
         for lang, translated_text in primary_results:
@@ -343,20 +784,146 @@ class TranslationService:
         # 2. 如果有失败的，使用备用引擎重试
         if failed_langs:
             logger.warning(f"[TranslationService] 主引擎翻译失败，切换备用引擎: {backup_engine}，失败语言: {failed_langs}")
-            backup_tasks = [translate_one(lang, backup_engine) for lang in failed_langs]
+            backup_tasks = [self._translate_one(text, source_lang, lang, backup_engine) for lang in failed_langs]
             backup_results = await asyncio.gather(*backup_tasks)
             for lang, translated_text in backup_results:
-                if translated_text is not None:
-                    final_results[lang] = translated_text
-                else:
-                    final_results[lang] = f"[翻译失败]主备引擎({prefer}, {backup_engine})均异常"
+                final_results[lang] = translated_text
+        return final_results
+
+    def _split_for_translation(self, text):
+        """
+        按分段配置切分文本；不满足分段条件（未开启、过短、可翻译片段少于2个）时返回 None
+        """
+        seg_cfg = self.config_manager.get("segmentation", {}) or {}
+        if not seg_cfg.get("enabled", False) or len(text) < int(seg_cfg.get("min_chars", 200)):
+            return None
+        from .segment import split_segments
+        pieces = split_segments(text, int(seg_cfg.get("max_segment_chars", 400)))
+        if sum(1 for _, translatable in pieces if translatable) < 2:
+            return None
+        return pieces
+
+    async def _translate_segmented(self, pieces, source_lang, target_langs, prefer, backup_engine):
+        """
+        分段并发翻译：每个不同的片段独立翻译与缓存，再按原顺序重组；
+        同一条消息最多 max_parallel 个片段同时请求，避免一条长消息占满引擎并发与等待队列；
+        翻译失败的片段保留原文，所有片段均失败时该语言视为失败
+        """
+        from .segment import join_segments
+        seg_cfg = self.config_manager.get("segmentation", {}) or {}
+        limit = asyncio.Semaphore(max(1, int(seg_cfg.get("max_parallel", 2))))
+        segments = list(dict.fromkeys(piece for piece, translatable in pieces if translatable))
+        self._segmented += 1
+        self._segments_total += len(segments)
+        logger.info(f"[TranslationService] 分段翻译: {len(segments)} 个片段")
+
+        async def _one(segment):
+            async with limit:
+                return await self._translate_text(segment, source_lang, target_langs, prefer, backup_engine)
+
+        seg_results = await asyncio.gather(*[_one(segment) for segment in segments])
+        final_results = {}
+        for lang in target_langs:
+            translations = {}
+            for segment, results in zip(segments, seg_results):
+                translated = results.get(lang)
+                if translated:
+                    translations[segment] = translated.strip()
+            failed = len(segments) - len(translations)
+            if failed and translations:
+                self._segment_failures += failed
+                logger.warning(f"[TranslationService] 分段翻译 {lang}: {failed}/{len(segments)} 个片段失败，保留原文")
+            final_results[lang] = join_segments(pieces, translations) if translations else None
+        return final_results
+
+    async def translate(self, text, source_lang, target_langs, prefer=None):
+        """
+        并发翻译，主备切换，带缓存；长文本按片段翻译与缓存
+        """
+        logger.info(f"[TranslationService] 翻译请求: text={text[:20]}..., source_lang={source_lang}, target_langs={target_langs}, prefer={prefer}")
+        if prefer is None:
+            prefer = self.default_engine
+        backup_engine = "deeplx" if prefer == "openai" else "openai"
+        pieces = self._split_for_translation(text)
+        if pieces is not None:
+            final_results = await self._translate_segmented(pieces, source_lang, target_langs, prefer, backup_engine)
+        else:
+            final_results = await self._translate_text(text, source_lang, target_langs, prefer, backup_engine)
+        for lang, translated_text in final_results.items():
+            if translated_text is None:
+                final_results[lang] = f"[翻译失败]主备引擎({prefer}, {backup_engine})均异常"
 
         logger.info(f"[TranslationService] 翻译结果: {final_results}")
         return {k: v for k, v in final_results.items() if v is not None and v != ""}
 
-    async def health_check_loop(self, interval=600):
+    async def translate_stream(self, text, source_lang, lang, prefer=None):
+        """
+        流式翻译单个目标语言，逐步产出累计译文；缓存命中或引擎不支持流式时一次性产出完整结果，
+        流式失败时回退为普通翻译（含主备切换）
+        """
+        if prefer is None:
+            prefer = self.default_engine
+        cache_key = (text, source_lang, lang, prefer)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        engine = self.engines.get(prefer)
+        partial = None
+        if hasattr(engine, "translate_stream"):
+            # 上游在独立任务中读取，只保留最新的累计译文；调用方在两次读取之间做的发送/编辑（可能因限速等待）
+            # 不会占用引擎与端点的并发名额，上游读完即释放
+            state = {"partial": None, "done": False}
+            updated = asyncio.Event()
+
+            async def _pump():
+                try:
+                    async with self.scheduler.engine_slot(prefer):
+                        self._upstream_calls += 1
+                        logger.info(f"[TranslationService] 流式调用引擎: {prefer}, 目标语言: {lang}")
+                        async for chunk in engine.translate_stream(text, source_lang, lang):
+                            state["partial"] = chunk
+                            updated.set()
+                finally:
+                    state["done"] = True
+                    updated.set()
+
+            task = asyncio.ensure_future(_pump())
+            try:
+                while True:
+                    await updated.wait()
+                    updated.clear()
+                    # 先读取结束标记：产出期间上游可能已读完，此时还需再取一次最新译文
+                    done = state["done"]
+                    latest = state["partial"]
+                    if latest is not None and latest != partial:
+                        partial = latest
+                        yield partial
+                    if done:
+                        break
+                await task
+            except Exception as e:
+                logger.error(f"[TranslationService] 流式翻译失败，回退普通翻译: engine={prefer}, lang={lang}, error={e}")
+                partial = None
+            finally:
+                if not task.done():
+                    task.cancel()
+            if partial and partial.strip() != text.strip():
+                self._cache_store(cache_key, partial)
+                return
+        results = await self.translate(text, source_lang, [lang], prefer=prefer)
+        if results.get(lang):
+            yield results[lang]
+
+    async def health_check_loop(self, interval=None):
         """
-        后台健康检查任务
+        后台健康检查任务：定期探测各引擎已熔断的端点，恢复后无需重启
         """
-        # TODO: 定期检查各引擎健康状态
-        raise NotImplementedError
+        interval = interval or self._health_check_interval
+        while True:
+            await asyncio.sleep(interval)
+            for name, engine in self.engines.items():
+                try:
+                    await engine.health_check()
+                except Exception as e:
+                    logger.error(f"[TranslationService] 引擎 {name} 健康检查异常: {e}")
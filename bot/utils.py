@@ -4,42 +4,114 @@ utils.py
 """
 
 import re
+import logging
 
-def build_ignore_patterns(words):
+logger = logging.getLogger(__name__)
+
+# 中文忽略词后允许紧跟的分隔符（与原正则字符类一致，数字/空白另行判断）
+_ZH_IGNORE_DELIMS = frozenset("/，,。.!！、：:；;（）()[]-—_")
+
+
+class IgnoreMatcher:
     """
-    根据 ignore_words 列表构建正则模式列表
+    忽略词匹配器：将所有忽略词编译为一棵前缀树（按小写字符），
+    对每行只需沿树走一遍行首字符，耗时只与最长忽略词长度相关，与忽略词数量无关
     """
-    patterns = []
-    for word in words:
-        w = word.strip()
-        if not w:
-            continue
-        if re.search(r'[\u4e00-\u9fff]', w):
-            patterns.append(re.compile(rf"^{re.escape(w)}([\d\s/，,。.!！、：:；;（）()\[\]\-—_]|$)", re.IGNORECASE))
-        else:
-            patterns.append(re.compile(rf"^{re.escape(w)}(\s|$|\d+)", re.IGNORECASE))
-    return patterns
+    _TERMINAL = object()
+
+    def __init__(self, words):
+        self._root = {}
+        self.size = 0
+        for word in words:
+            w = str(word).strip()
+            if not w:
+                continue
+            node = self._root
+            for ch in w:
+                node = node.setdefault(ch.lower(), {})
+            # 含中文的词允许后接标点；其余仅允许后接空白、数字或行尾
+            node[self._TERMINAL] = bool(re.search(r'[\u4e00-\u9fff]', w))
+            self.size += 1
+
+    def match_line(self, line):
+        """
+        判断单行（已 strip）是否以任一忽略词开头且边界合法
+        """
+        node = self._root
+        n = len(line)
+        for i, ch in enumerate(line):
+            node = node.get(ch.lower())
+            if node is None:
+                return False
+            is_zh = node.get(self._TERMINAL)
+            if is_zh is None:
+                continue
+            nxt = line[i + 1] if i + 1 < n else ""
+            if not nxt or nxt.isspace() or nxt.isdecimal():
+                return True
+            if is_zh and nxt in _ZH_IGNORE_DELIMS:
+                return True
+        return False
+
+    def match(self, text):
+        if not self._root:
+            return False
+        for line in text.strip().splitlines():
+            if self.match_line(line.strip()):
+                return True
+        return False
+
 
-def should_ignore(text, ignore_patterns):
+def build_ignore_matcher(words):
+    """
+    根据 ignore_words 列表构建忽略词匹配器
+    """
+    return IgnoreMatcher(words or [])
+
+def should_ignore(text, ignore_matcher):
     """
     判断文本是否应被忽略
     """
-    lines = text.strip().splitlines()
-    for line in lines:
-        l = line.strip()
-        for pat in ignore_patterns:
-            if pat.match(l):
-                return True
-    return False
+    return ignore_matcher.match(text)
+
+def parse_my_tg_ids(tg_cfg):
+    """
+    解析 telegram.my_tg_ids 白名单，兼容单用户写法 my_tg_id；
+    非数字的条目（如未替换的占位符 xxxxxxxxxx）跳过并输出警告，不影响其他条目与消息处理
+    """
+    ids = tg_cfg.get("my_tg_ids", []) or []
+    if not ids:
+        single_id = tg_cfg.get("my_tg_id")
+        if single_id is not None:
+            ids = [single_id]
+    parsed = set()
+    for i in ids:
+        if i is None:
+            continue
+        try:
+            parsed.add(int(i))
+        except (TypeError, ValueError):
+            logger.warning(f"[Utils] my_tg_ids 中的无效用户ID已跳过: {i!r}")
+    return frozenset(parsed)
 
 import asyncio
 
+# 出站消息调度器，由 TelegramBot 初始化时注入；未注入时直接回复
+_outbound = None
+
+def configure_outbound(dispatcher):
+    global _outbound
+    _outbound = dispatcher
+
 async def send_ephemeral_reply(event, reply_text, delay=15):
     """
-    发送临时回复，延迟 delay 秒后自动删除命令和回复消息
+    发送临时回复（经出站调度器以命令优先级发送），延迟 delay 秒后自动删除命令和回复消息
     """
     try:
-        rep_msg = await event.reply(reply_text)
+        if _outbound is not None:
+            rep_msg = await _outbound.submit(event, reply_text, kind=_outbound.COMMAND)
+        else:
+            rep_msg = await event.reply(reply_text)
         chat_id = event.chat_id
         operator_id = event.sender_id
         import logging
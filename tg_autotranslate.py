@@ -20,7 +20,7 @@ def main():
     )
     # 初始化各业务模块
     config_manager = ConfigManager("config.yaml")
-    rule_manager = RuleManager("dynamic_rules.json")
+    rule_manager = RuleManager("dynamic_rules.json", config_manager.get("rules_storage", {}))
     translation_service = TranslationService(config_manager)
     lang_detector = LanguageDetector(config_manager)
     command_dispatcher = CommandDispatcher(None)  # 先传 None，稍后注入 bot 实例